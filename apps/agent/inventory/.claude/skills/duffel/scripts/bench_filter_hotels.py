@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Benchmark the columnar hotel filter against the per-item scan.
+
+Synthetic tables are generated by jittering a real raw dump around the
+search centre, so facility lists and rating distributions stay realistic.
+
+``query`` is the per-query cost once a ``HotelTable`` exists; ``1 query``
+adds the build, which is what a single-criteria ``filter_hotels.py`` run
+would pay. ``break-even`` is the number of queries against one table
+after which it beats scanning each time.
+
+Usage:
+    python bench_filter_hotels.py --raw files/content/accommodations/lajatico_raw_hotels.json \
+        --criteria files/context/accommodation.json --sizes 1000 10000 100000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from filter_hotels import FilterQuery, HotelTable, filter_hotels, load_raw_hotels, scan_filter  # noqa: E402
+
+
+def synthesize(seed_hotels: list[dict], size: int, query: FilterQuery, spread_deg: float, rng: np.random.Generator) -> list[dict]:
+    picks = rng.integers(0, len(seed_hotels), size=size)
+    lat = rng.normal(query.latitude, spread_deg, size=size)
+    lon = rng.normal(query.longitude, spread_deg, size=size)
+    return [
+        dict(seed_hotels[p], id=f"bench{i}", latitude=float(lat[i]), longitude=float(lon[i]))
+        for i, p in enumerate(picks)
+    ]
+
+
+def best_of(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark HotelTable filtering vs a per-item scan")
+    parser.add_argument("--raw", nargs="+", required=True, type=Path)
+    parser.add_argument("--criteria", required=True, type=Path)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--spread-deg", type=float, default=1.0, help="Std-dev of synthetic coordinates")
+    parser.add_argument("--facility", type=int, action="append", default=[])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed_hotels = load_raw_hotels(args.raw)
+    query = FilterQuery.from_context(json.loads(args.criteria.read_text()), tuple(args.facility))
+    rng = np.random.default_rng(0)
+
+    print(
+        f"{'hotels':>8} {'matches':>8} {'scan ms':>9} {'build ms':>9} {'query ms':>9} {'1 query ms':>11} "
+        f"{'reused':>8} {'1 query':>8} {'break-even':>10}"
+    )
+    for size in args.sizes:
+        hotels = synthesize(seed_hotels, size, query, args.spread_deg, rng)
+        scan_s, scanned = best_of(lambda: scan_filter(hotels, query), args.repeat)
+        build_s, table = best_of(lambda: HotelTable(hotels), args.repeat)
+        query_s, (idx, _) = best_of(lambda: filter_hotels(table, query), args.repeat)
+        if sorted(table.ids[idx]) != sorted(h["id"] for h in scanned):
+            print(f"mismatch at size {size}", file=sys.stderr)
+            return 1
+        single_s = build_s + query_s
+        break_even = math.ceil(build_s / (scan_s - query_s)) if scan_s > query_s else "never"
+        print(
+            f"{size:>8} {len(idx):>8} {scan_s * 1e3:>9.2f} {build_s * 1e3:>9.2f} {query_s * 1e3:>9.2f} "
+            f"{single_s * 1e3:>11.2f} {scan_s / query_s:>7.1f}x {scan_s / single_s:>7.2f}x {break_even:>10}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Filter raw hotel search results down to accommodation candidates.
+
+Raw supplier dumps (``files/content/accommodations/*.json``) are loaded into a
+columnar ``HotelTable`` backed by NumPy arrays and a ``GridIndex``; radius,
+rating, review-count and facility constraints are then answered in one
+batched pass instead of a per-hotel loop.
+
+Building the table costs a few per-item scans (see
+``bench_filter_hotels.py``), so it only pays off when queried repeatedly.
+Several ``--criteria`` files share one table; a single query is answered
+with ``scan_filter`` instead.
+
+Usage:
+    python filter_hotels.py --raw files/content/accommodations/lajatico_raw_hotels.json \
+        --criteria files/context/accommodation.json
+    python filter_hotels.py --raw raw_dir/ --criteria occasion_a.json occasion_b.json --output candidates.json
+    python filter_hotels.py --raw raw.json --latitude 43.47 --longitude 10.74 \
+        --radius-km 25 --min-rating 8 --min-reviews 100 --facility 16 --output candidates.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+
+from shared.geo import EARTH_RADIUS_KM, GridIndex  # noqa: E402
+from shared.instrumentation import span  # noqa: E402
+from shared.raw_store import iter_items, iter_raw_files  # noqa: E402
+
+
+# Largest facility id handled by the dense vocabulary lookup in ``_vocabulary``.
+DENSE_VOCAB_LIMIT = 1 << 20
+
+
+@dataclass(frozen=True)
+class FilterQuery:
+    latitude: float
+    longitude: float
+    radius_km: float
+    min_rating: float = 0.0
+    min_reviews: int = 0
+    facility_ids: tuple[int, ...] = ()
+
+    @classmethod
+    def from_context(cls, context: dict, facility_ids: tuple[int, ...] = ()) -> FilterQuery:
+        """Build a query from the ``search_location``/``search_criteria`` blocks."""
+        location = context["search_location"]
+        criteria = context.get("search_criteria") or {}
+        return cls(
+            latitude=float(location["latitude"]),
+            longitude=float(location["longitude"]),
+            radius_km=float(location["radius_km"]),
+            min_rating=float(criteria.get("min_rating") or 0.0),
+            min_reviews=int(criteria.get("min_reviews") or 0),
+            facility_ids=tuple(facility_ids),
+        )
+
+
+def _float(value) -> float:
+    return float(value) if value is not None else math.nan
+
+
+def _vocabulary(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """``(sorted unique values, position of each value in them)``.
+
+    Facility ids are small non-negative ints, so a dense lookup table
+    replaces the sort ``np.unique`` does over every (hotel, facility) pair.
+    """
+    if len(values) and values.min() >= 0 and values.max() < DENSE_VOCAB_LIMIT:
+        present = np.bincount(values) > 0
+        return np.flatnonzero(present), (np.cumsum(present) - 1)[values]
+    return np.unique(values, return_inverse=True)
+
+
+class HotelTable:
+    """Columnar, de-duplicated view over a list of raw hotel items.
+
+    ``facility_ids`` are packed into a per-hotel bitset over the table's
+    facility vocabulary so "must have all of these facilities" is a couple
+    of vectorized AND/compare operations.
+    """
+
+    def __init__(self, items: list[dict]):
+        seen: set[str] = set()
+        self.items: list[dict] = []
+        for item in items:
+            if item.get("id") in seen:
+                continue
+            seen.add(item.get("id"))
+            self.items.append(item)
+
+        n = len(self.items)
+        self.ids = np.array([item.get("id") for item in self.items], dtype=object)
+        self.latitude = np.array([_float(item.get("latitude")) for item in self.items], dtype=np.float64)
+        self.longitude = np.array([_float(item.get("longitude")) for item in self.items], dtype=np.float64)
+        self.rating = np.array([_float(item.get("rating")) for item in self.items], dtype=np.float64)
+        self.rating_count = np.array([item.get("rating_count") or 0 for item in self.items], dtype=np.int64)
+        self.stars = np.array([item.get("stars") or 0 for item in self.items], dtype=np.int16)
+
+        facilities = [item.get("facility_ids") or () for item in self.items]
+        lengths = np.fromiter(map(len, facilities), dtype=np.int64, count=n)
+        flat = np.fromiter(chain.from_iterable(facilities), dtype=np.int64, count=int(lengths.sum()))
+        self.facility_vocab, pos = _vocabulary(flat)
+        words = max(1, (len(self.facility_vocab) + 63) // 64)
+        self._facility_bits = np.zeros((n, words), dtype=np.uint64)
+        if len(flat):
+            rows = np.repeat(np.arange(n), lengths)
+            np.bitwise_or.at(
+                self._facility_bits,
+                (rows, pos // 64),
+                np.left_shift(np.uint64(1), (pos % 64).astype(np.uint64)),
+            )
+
+        self.index = GridIndex(self.latitude, self.longitude)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def facility_mask(self, facility_ids: tuple[int, ...]) -> np.ndarray:
+        """Boolean mask of hotels that have every facility in ``facility_ids``."""
+        if not facility_ids:
+            return np.ones(len(self), dtype=bool)
+        wanted = np.unique(np.asarray(facility_ids, dtype=np.int64))
+        if not np.all(np.isin(wanted, self.facility_vocab)):
+            return np.zeros(len(self), dtype=bool)
+        pos = np.searchsorted(self.facility_vocab, wanted)
+        query = np.zeros(self._facility_bits.shape[1], dtype=np.uint64)
+        np.bitwise_or.at(query, pos // 64, np.left_shift(np.uint64(1), (pos % 64).astype(np.uint64)))
+        cols = np.flatnonzero(query)
+        return np.all((self._facility_bits[:, cols] & query[cols]) == query[cols], axis=1)
+
+
+def filter_hotels(table: HotelTable, query: FilterQuery) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(indices, distances_km)`` of matching hotels, nearest first."""
+    idx, dist = table.index.query_radius(query.latitude, query.longitude, query.radius_km)
+    keep = np.ones(len(idx), dtype=bool)
+    if query.min_rating > 0:
+        keep &= table.rating[idx] >= query.min_rating
+    if query.min_reviews > 0:
+        keep &= table.rating_count[idx] >= query.min_reviews
+    if query.facility_ids:
+        keep &= table.facility_mask(query.facility_ids)[idx]
+    idx, dist = idx[keep], dist[keep]
+    order = np.lexsort((idx, dist))
+    return idx[order], dist[order]
+
+
+def scan_filter(items: list[dict], query: FilterQuery, with_distance: bool = False) -> list:
+    """Per-item implementation, nearest first; ``with_distance`` yields ``(km, item)`` pairs.
+
+    Cheaper than building a ``HotelTable`` for a single query.
+    """
+    wanted = set(query.facility_ids)
+    lat0 = math.radians(query.latitude)
+    seen: set[str] = set()
+    matches = []
+    for item in items:
+        if item.get("id") in seen:
+            continue
+        seen.add(item.get("id"))
+        lat, lon = item.get("latitude"), item.get("longitude")
+        if lat is None or lon is None:
+            continue
+        lat1 = math.radians(lat)
+        dlon = math.radians(lon - query.longitude)
+        a = math.sin((lat1 - lat0) / 2) ** 2 + math.cos(lat0) * math.cos(lat1) * math.sin(dlon / 2) ** 2
+        distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+        if distance > query.radius_km:
+            continue
+        if query.min_rating > 0 and (item.get("rating") or 0) < query.min_rating:
+            continue
+        if query.min_reviews > 0 and (item.get("rating_count") or 0) < query.min_reviews:
+            continue
+        if wanted and not wanted.issubset(item.get("facility_ids") or ()):
+            continue
+        matches.append((distance, item))
+    matches.sort(key=lambda pair: pair[0])
+    return matches if with_distance else [item for _, item in matches]
+
+
+def load_raw_hotels(paths: list[Path]) -> list[dict]:
+    """Concatenate the items of raw result files (``.json``/``.jsonl``/``.jsonl.gz``) or directories."""
+    hotels: list[dict] = []
+    for path in map(Path, paths):
+        for raw_file in iter_raw_files(path) if path.is_dir() else [path]:
+            hotels.extend(iter_items(raw_file))
+    return hotels
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Filter raw hotel results by radius, rating and facilities")
+    parser.add_argument("--raw", nargs="+", required=True, type=Path, help="Raw hotel result file(s) or directories")
+    parser.add_argument(
+        "--criteria", nargs="+", type=Path, help="JSON with search_location/search_criteria blocks (several share one table)"
+    )
+    parser.add_argument("--latitude", type=float)
+    parser.add_argument("--longitude", type=float)
+    parser.add_argument("--radius-km", type=float)
+    parser.add_argument("--min-rating", type=float, default=0.0)
+    parser.add_argument("--min-reviews", type=int, default=0)
+    parser.add_argument("--facility", type=int, action="append", default=[], help="Required facility id (repeatable)")
+    parser.add_argument("--output", type=Path, help="Write result here instead of stdout")
+    args = parser.parse_args()
+
+    if args.criteria:
+        queries = [FilterQuery.from_context(json.loads(path.read_text()), tuple(args.facility)) for path in args.criteria]
+    elif None in (args.latitude, args.longitude, args.radius_km):
+        parser.error("either --criteria or --latitude/--longitude/--radius-km is required")
+    else:
+        queries = [FilterQuery(
+            latitude=args.latitude,
+            longitude=args.longitude,
+            radius_km=args.radius_km,
+            min_rating=args.min_rating,
+            min_reviews=args.min_reviews,
+            facility_ids=tuple(args.facility),
+        )]
+
+    with span("inventory.accommodation.filter", queries=len(queries)) as attrs:
+        items = load_raw_hotels(args.raw)
+        if len(queries) == 1:
+            input_count = len({item.get("id") for item in items})
+            answers = [[dict(h, distance_km=round(d, 2)) for d, h in scan_filter(items, queries[0], with_distance=True)]]
+        else:
+            table = HotelTable(items)
+            input_count = len(table)
+            answers = []
+            for query in queries:
+                idx, dist = filter_hotels(table, query)
+                answers.append([dict(table.items[i], distance_km=round(float(d), 2)) for i, d in zip(idx, dist)])
+        attrs["items"] = input_count
+        attrs["selected"] = sum(map(len, answers))
+    generated_at = datetime.now(timezone.utc).isoformat()
+    results = [
+        {
+            "query": query.__dict__ | {"facility_ids": list(query.facility_ids)},
+            "input_count": input_count,
+            "count": len(hotels),
+            "generated_at": generated_at,
+            "hotels": hotels,
+        }
+        for query, hotels in zip(queries, answers)
+    ]
+    result = results[0] if len(results) == 1 else {"results": results}
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(text)
+        counts = [r["count"] for r in results]
+        print(json.dumps({"success": True, "count": counts[0] if len(counts) == 1 else counts, "output": str(args.output)}))
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
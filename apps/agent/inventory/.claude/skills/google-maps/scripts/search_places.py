@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Search Google Places for every activity category query, concurrently.
+
+Queries run on a thread pool that shares one pooled HTTP session and one
+token bucket per API key, so the step's wall-clock time tracks the slowest
+query rather than the sum of all of them. Transient failures (429, 5xx,
+connection errors) are retried with jittered backoff, and each page of
+results is written to the query's raw JSONL file in ``--output-dir`` as
+soon as it arrives. Each run replaces the query's file from the previous
+run, but only once the query succeeded: a failed query keeps the old
+results.
+
+Usage:
+    python search_places.py --context files/context/activities.json \
+        --location-from files/context/accommodation.json
+    python search_places.py --query "wine bar" --category "Wine Bars & Aperitivo" \
+        --latitude 43.4689 --longitude 10.7385 --radius-km 25
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+
+from shared.api_client import pooled_session  # noqa: E402
+from shared.instrumentation import span  # noqa: E402
+from shared.maps_client import MapsClient  # noqa: E402
+from shared.ratelimit import bucket_for, retry_with_backoff  # noqa: E402
+from shared.raw_store import RawWriter  # noqa: E402
+
+DEFAULT_OUTPUT_DIR = Path("files/content/activities")
+# Google needs a moment before a next_page_token becomes valid.
+PAGE_TOKEN_DELAY = 2.0
+
+
+@dataclass(frozen=True)
+class SearchTask:
+    category: str
+    query: str
+
+
+def load_tasks(context: dict) -> list[SearchTask]:
+    """One task per ``search_queries`` entry of each category in activities.json."""
+    tasks = []
+    for category in context.get("categories", []):
+        for query in category.get("search_queries", []):
+            tasks.append(SearchTask(category=category["name"], query=query))
+    return tasks
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def normalize_place(result: dict, task: SearchTask) -> dict:
+    """Flat list format shared with the occasion masterlist."""
+    location = (result.get("geometry") or {}).get("location") or {}
+    return {
+        "id": result.get("place_id"),
+        "source": "google_maps",
+        "name": result.get("name"),
+        "category": task.category,
+        "rating": result.get("rating"),
+        "rating_count": result.get("user_ratings_total"),
+        "address": result.get("formatted_address"),
+        "latitude": location.get("lat"),
+        "longitude": location.get("lng"),
+        "price_level": result.get("price_level"),
+        "types": result.get("types", []),
+        "search_query": task.query,
+    }
+
+
+def raw_path(output_dir: Path, task: SearchTask, compress: bool = False) -> Path:
+    suffix = ".jsonl.gz" if compress else ".jsonl"
+    return output_dir / f"{slugify(task.category)}__{slugify(task.query)}{suffix}"
+
+
+def search_one(
+    client: MapsClient,
+    task: SearchTask,
+    latitude: float,
+    longitude: float,
+    radius_m: int,
+    pages: int,
+    writer: RawWriter,
+) -> tuple[int, int]:
+    """Run one query (following up to ``pages`` pages) into ``writer``; return place and retry counts."""
+    retries = 0
+
+    def count_retry(*_):
+        nonlocal retries
+        retries += 1
+
+    count = 0
+    token = None
+    follow = pages > 1  # a cached first page would hand out an expired next_page_token
+    for page in range(pages):
+        if page:
+            time.sleep(PAGE_TOKEN_DELAY)
+        response = retry_with_backoff(
+            lambda: client.text_search(task.query, latitude, longitude, radius_m, page_token=token, follow_pages=follow),
+            on_retry=count_retry,
+        )
+        count += writer.append_page(normalize_place(r, task) for r in response.get("results", []))
+        token = response.get("next_page_token")
+        if not token:
+            break
+    return count, retries
+
+
+def run_searches(
+    client: MapsClient,
+    tasks: list[SearchTask],
+    latitude: float,
+    longitude: float,
+    radius_m: int,
+    output_dir: Path,
+    workers: int = 8,
+    pages: int = 1,
+    compress: bool = False,
+) -> dict:
+    """Fan ``tasks`` out over a thread pool, streaming each page to its raw file."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    summaries, errors = [], []
+
+    def timed(task: SearchTask):
+        t0 = time.perf_counter()
+        with RawWriter(
+            raw_path(output_dir, task, compress),
+            meta={"source": "google_maps", "category": task.category, "query": task.query},
+            fresh=True,
+        ) as writer:
+            count, retries = search_one(client, task, latitude, longitude, radius_m, pages, writer)
+        return count, retries, time.perf_counter() - t0, writer.path
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(timed, task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                count, retries, seconds, path = future.result()
+            except Exception as error:
+                errors.append({"category": task.category, "query": task.query, "error": str(error)})
+                continue
+            summaries.append({
+                "category": task.category,
+                "query": task.query,
+                "count": count,
+                "retries": retries,
+                "seconds": round(seconds, 3),
+                "file": str(path),
+            })
+
+    return {
+        "success": not errors,
+        "queries": len(tasks),
+        "places": sum(s["count"] for s in summaries),
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "sum_query_seconds": round(sum(s["seconds"] for s in summaries), 3),
+        "results": summaries,
+        "errors": errors,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Concurrent Google Places text search for activity categories")
+    parser.add_argument("--context", type=Path, help="activities.json with categories[].search_queries")
+    parser.add_argument("--query", help="Single query (instead of --context)")
+    parser.add_argument("--category", default="uncategorized", help="Category for --query")
+    parser.add_argument("--location-from", type=Path, help="JSON with a search_location block (lat/long/radius_km)")
+    parser.add_argument("--latitude", type=float)
+    parser.add_argument("--longitude", type=float)
+    parser.add_argument("--radius-km", type=float, default=25.0)
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--qps", type=float, default=float(os.environ.get("GOOGLE_MAPS_QPS", 10)))
+    parser.add_argument("--pages", type=int, default=1, help="Result pages per query (max 3)")
+    parser.add_argument("--gzip", action="store_true", help="Write .jsonl.gz instead of .jsonl")
+    args = parser.parse_args()
+
+    if args.location_from:
+        location = json.loads(args.location_from.read_text())["search_location"]
+        args.latitude = args.latitude if args.latitude is not None else location["latitude"]
+        args.longitude = args.longitude if args.longitude is not None else location["longitude"]
+        args.radius_km = location.get("radius_km", args.radius_km)
+    if args.latitude is None or args.longitude is None:
+        parser.error("--latitude/--longitude or --location-from is required")
+
+    if args.context:
+        tasks = load_tasks(json.loads(args.context.read_text()))
+    elif args.query:
+        tasks = [SearchTask(category=args.category, query=args.query)]
+    else:
+        parser.error("either --context or --query is required")
+
+    client = MapsClient(session=pooled_session(args.workers))
+    client.rate_limiter = bucket_for(client.api_key, args.qps)
+    with span("inventory.activities.search", queries=len(tasks)) as attrs:
+        summary = run_searches(
+            client,
+            tasks,
+            args.latitude,
+            args.longitude,
+            int(min(args.radius_km * 1000, 50_000)),
+            args.output_dir,
+            workers=args.workers,
+            pages=max(1, min(args.pages, 3)),
+            compress=args.gzip,
+        )
+        attrs["items"] = summary["places"]
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0 if summary["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
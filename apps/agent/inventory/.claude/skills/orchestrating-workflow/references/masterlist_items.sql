@@ -0,0 +1,56 @@
+-- Per-item store behind occasions.accommodations / occasions.activities.
+--
+-- masterlist_sync.py diffs local results against content_hash here and only
+-- upserts/deletes the rows that changed, then calls rebuild_masterlist()
+-- once so the occasions JSONB column is rewritten a single time per field
+-- without sending the full array over the wire.
+--
+-- occasion_masterlist_state.pending is set before the first write of a sync
+-- and cleared by rebuild_masterlist() in the same transaction as the
+-- rebuild, so a sync that dies between its writes and the rebuild leaves
+-- the flag behind and the next sync rebuilds even when its delta is empty.
+
+CREATE TABLE IF NOT EXISTS occasion_masterlist_items (
+    occasion_id  UUID        NOT NULL REFERENCES occasions(id) ON DELETE CASCADE,
+    field        TEXT        NOT NULL CHECK (field IN ('accommodations', 'activities')),
+    item_id      TEXT        NOT NULL,            -- supplier id: lp... hotels, ChIJ... places
+    content_hash TEXT        NOT NULL,
+    item         JSONB       NOT NULL,
+    updated_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (occasion_id, field, item_id)
+);
+
+CREATE TABLE IF NOT EXISTS occasion_masterlist_state (
+    occasion_id  UUID        NOT NULL REFERENCES occasions(id) ON DELETE CASCADE,
+    field        TEXT        NOT NULL CHECK (field IN ('accommodations', 'activities')),
+    pending      BOOLEAN     NOT NULL DEFAULT false,
+    updated_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (occasion_id, field)
+);
+
+CREATE OR REPLACE FUNCTION rebuild_masterlist(p_occasion_id UUID, p_field TEXT)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_items JSONB;
+BEGIN
+    IF p_field NOT IN ('accommodations', 'activities') THEN
+        RAISE EXCEPTION 'unknown masterlist field: %', p_field;
+    END IF;
+
+    SELECT COALESCE(jsonb_agg(item ORDER BY item_id), '[]'::jsonb)
+      INTO v_items
+      FROM occasion_masterlist_items
+     WHERE occasion_id = p_occasion_id AND field = p_field;
+
+    EXECUTE format('UPDATE occasions SET %I = $1, updated_at = now() WHERE id = $2', p_field)
+      USING v_items, p_occasion_id;
+
+    UPDATE occasion_masterlist_state
+       SET pending = false, updated_at = now()
+     WHERE occasion_id = p_occasion_id AND field = p_field;
+
+    RETURN jsonb_array_length(v_items);
+END;
+$$;
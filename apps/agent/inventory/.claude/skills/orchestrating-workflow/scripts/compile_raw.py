@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Incrementally compile raw result files into de-duplicated item stores.
+
+Called by ``orchestrate.py --completed-step <step>`` to compute
+``raw_file_count``/``raw_item_count`` and by the final step to stream the
+compiled masterlists. Raw files are read with generators and inserted in
+batches, so memory stays flat regardless of how many hotels a city has.
+Progress is recorded per file in ``files/process/compiled.sqlite3``:
+
+* ``.jsonl``/``.jsonl.gz`` files are append-only, so only the bytes added
+  since the last compile are parsed;
+* legacy ``.json`` dumps are re-parsed only when their size or mtime changes.
+
+A file's identity is its inode plus a hash of its first bytes (the
+``_meta`` header, which carries ``created_at``). Items are stored per
+source file and the compiled list takes each id's most recently read
+copy, so when a known file was deleted, replaced (e.g. by a quarterly
+re-search) or shrank, or a legacy dump changed, only that file's items
+are dropped (and a replaced file re-read); every other file stays as
+compiled.
+
+Usage:
+    python compile_raw.py --step accommodation
+    python compile_raw.py --step activities --export files/process/activities_compiled.json
+    python compile_raw.py --status
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+
+from shared.instrumentation import span  # noqa: E402
+from shared.raw_store import committed_size, iter_items, iter_raw_files  # noqa: E402
+
+FILES_DIR = Path("files")
+DB_PATH = FILES_DIR / "process" / "compiled.sqlite3"
+BATCH_SIZE = 500
+# Leading bytes hashed into a raw file's identity; always covers the ``_meta`` header.
+IDENTITY_BYTES = 4096
+# Bumped when the tables change shape; they only hold derived data, so older ones are dropped.
+SCHEMA_VERSION = 3
+
+# Workflow step -> (item kind, raw content directory under files/)
+STEP_SOURCES = {
+    "accommodation": ("accommodations", Path("content/accommodations")),
+    "activities": ("activities", Path("content/activities")),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS raw_files (
+    path     TEXT PRIMARY KEY,
+    kind     TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode    INTEGER NOT NULL,
+    head_len INTEGER NOT NULL,
+    head     TEXT NOT NULL,
+    offset   INTEGER NOT NULL,
+    items    INTEGER NOT NULL
+);
+-- One row per item per raw file it was read from; the newest rowid of an id wins.
+CREATE TABLE IF NOT EXISTS items (
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    id   TEXT NOT NULL,
+    body TEXT NOT NULL,
+    UNIQUE (kind, path, id)
+);
+CREATE INDEX IF NOT EXISTS items_by_id ON items (kind, id);
+"""
+
+
+def _item_id(item: dict, body: str) -> str:
+    return str(item.get("id") or hashlib.sha256(body.encode()).hexdigest())
+
+
+def _rows(kind: str, path: str, items: Iterable[dict]) -> Iterator[tuple[str, str, str, str]]:
+    for item in items:
+        body = json.dumps(item, separators=(",", ":"), ensure_ascii=False)
+        yield kind, path, _item_id(item, body), body
+
+
+def _head_hash(path: Path, length: int) -> str:
+    with open(path, "rb") as fh:
+        head = fh.read(length)
+    return hashlib.sha256(head).hexdigest() if len(head) == length else ""
+
+
+def _batches(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class RawCompiler:
+    def __init__(self, db_path: str | Path = DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self.conn.executescript("DROP TABLE IF EXISTS raw_files; DROP TABLE IF EXISTS items;")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def _store(self, kind: str, path: Path, items: Iterable[dict]) -> int:
+        count = 0
+        # REPLACE gives a re-read item a new rowid, so it becomes the id's newest copy.
+        for batch in _batches(_rows(kind, str(path), items), BATCH_SIZE):
+            self.conn.executemany("INSERT OR REPLACE INTO items (kind, path, id, body) VALUES (?, ?, ?, ?)", batch)
+            count += len(batch)
+        return count
+
+    def _drop(self, kind: str, path: Path | str) -> int:
+        """Forget what was compiled from ``path``; return the number of item rows dropped."""
+        dropped = self.conn.execute("DELETE FROM items WHERE kind = ? AND path = ?", (kind, str(path))).rowcount
+        self.conn.execute("DELETE FROM raw_files WHERE path = ?", (str(path),))
+        return dropped
+
+    def _row(self, path: Path) -> tuple | None:
+        return self.conn.execute(
+            "SELECT size, mtime_ns, inode, head_len, head, offset, items FROM raw_files WHERE path = ?", (str(path),)
+        ).fetchone()
+
+    def is_current(self, path: Path, row: tuple | None = None) -> bool:
+        """Whether what was compiled from ``path`` is still a prefix of the file on disk."""
+        row = row or self._row(path)
+        if row is None or not path.exists():
+            return False
+        size, mtime_ns, inode, head_len, head, offset, _ = row
+        stat = path.stat()
+        if path.name.endswith(".json"):
+            return size == stat.st_size and mtime_ns == stat.st_mtime_ns
+        return inode == stat.st_ino and offset <= stat.st_size and _head_hash(path, head_len) == head
+
+    def compile_file(self, kind: str, path: Path) -> int:
+        """Parse whatever part of ``path`` is new; return the number of items read.
+
+        A file that is no longer the one compiled before is read from the
+        start, after the items its old contents added are dropped.
+        """
+        stat = path.stat()
+        row = self._row(path)
+        current = self.is_current(path, row)
+        legacy = path.name.endswith(".json")
+
+        if legacy:
+            if current:
+                return 0
+            start, end, known = 0, stat.st_size, 0
+        else:
+            end = committed_size(path)
+            start, known = (row[5], row[6]) if current else (0, 0)
+            if current and start == end:
+                return 0
+        head_len = min(IDENTITY_BYTES, end) if start == 0 else row[3]
+
+        with self.conn:
+            if row is not None and not current:
+                self._drop(kind, path)
+            added = self._store(kind, path, iter_items(path, start, None if legacy else end))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO raw_files (path, kind, size, mtime_ns, inode, head_len, head, offset, items) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (str(path), kind, stat.st_size, stat.st_mtime_ns, stat.st_ino, head_len,
+                 _head_hash(path, head_len), end, known + added),
+            )
+        return added
+
+    def compile_dir(self, kind: str, directory: Path) -> dict:
+        """Compile every raw file in ``directory``.
+
+        Items of files that are gone or were replaced are dropped, and
+        replaced files are read again from the start. Nothing else is
+        re-parsed.
+        """
+        paths = list(iter_raw_files(directory))
+        present = {str(p) for p in paths}
+        rows = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                "SELECT path, size, mtime_ns, inode, head_len, head, offset, items FROM raw_files WHERE kind = ?",
+                (kind,),
+            )
+        }
+        removed = [p for p in rows if p not in present]
+        stale = [p for p in rows if p in present and not self.is_current(Path(p), rows[p])]
+        dropped = 0
+        with self.conn:
+            for path in removed + stale:
+                dropped += self._drop(kind, path)
+
+        parsed = skipped = new_items = 0
+        for path in paths:
+            added = self.compile_file(kind, path)
+            new_items += added
+            if added:
+                parsed += 1
+            else:
+                skipped += 1
+        return {
+            **self.counts(kind),
+            "files_parsed": parsed,
+            "files_skipped": skipped,
+            "files_removed": len(removed),
+            "files_replaced": len(stale),
+            "items_dropped": dropped,
+            "items_read": new_items,
+        }
+
+    def counts(self, kind: str) -> dict:
+        files, raw_items = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(items), 0) FROM raw_files WHERE kind = ?", (kind,)
+        ).fetchone()
+        unique = self.conn.execute("SELECT COUNT(DISTINCT id) FROM items WHERE kind = ?", (kind,)).fetchone()[0]
+        return {"raw_file_count": files, "raw_item_count": raw_items, "unique_item_count": unique}
+
+    def iter_compiled(self, kind: str) -> Iterator[dict]:
+        """Stream compiled items (each id's newest copy) in id order without materializing the list."""
+        # SQLite takes the bare ``body`` column from the row holding MAX(rowid).
+        cursor = self.conn.execute(
+            "SELECT body, MAX(rowid) FROM items WHERE kind = ? GROUP BY id ORDER BY id", (kind,)
+        )
+        for body, _ in cursor:
+            yield json.loads(body)
+
+
+def export_json(items: Iterator[dict], path: Path) -> int:
+    """Write items as a JSON array one element at a time."""
+    count = 0
+    with open(path, "w") as fh:
+        fh.write("[")
+        for item in items:
+            fh.write(("," if count else "") + "\n" + json.dumps(item, separators=(",", ":"), ensure_ascii=False))
+            count += 1
+        fh.write("\n]\n")
+    return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Incrementally compile raw results for a workflow step")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--step", choices=sorted(STEP_SOURCES))
+    group.add_argument("--status", action="store_true")
+    parser.add_argument("--files-dir", type=Path, default=FILES_DIR)
+    parser.add_argument("--export", type=Path, help="Also write the compiled list for --step as a JSON array")
+    args = parser.parse_args()
+
+    compiler = RawCompiler(args.files_dir / DB_PATH.relative_to(FILES_DIR))
+    try:
+        if args.status:
+            result = {kind: compiler.counts(kind) for kind, _ in STEP_SOURCES.values()}
+        else:
+            kind, directory = STEP_SOURCES[args.step]
+            with span(f"inventory.{args.step}.compile") as attrs:
+                result = {"step": args.step, "kind": kind, **compiler.compile_dir(kind, args.files_dir / directory)}
+                if args.export:
+                    result["exported"] = export_json(compiler.iter_compiled(kind), args.export)
+                attrs["items"] = result["unique_item_count"]
+    finally:
+        compiler.close()
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
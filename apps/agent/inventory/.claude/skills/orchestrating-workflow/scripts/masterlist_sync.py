@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Delta-sync compiled inventory results to the occasion masterlists.
+
+Each item is keyed on its supplier id (``lp...`` hotels, ``ChIJ...`` places)
+and fingerprinted with a content hash. The hashes already stored in
+``occasion_masterlist_items`` (see ``references/masterlist_items.sql``) are
+diffed against local results, and only added/changed rows are upserted and
+removed rows deleted, in size-bounded chunks. ``rebuild_masterlist`` then
+refreshes ``occasions.<field>`` server-side, once, and only when something
+changed. A quarterly refresh where nothing moved sends hashes one way and
+writes nothing.
+
+Before its first write a sync marks the field ``pending`` in
+``occasion_masterlist_state``; ``rebuild_masterlist`` clears the mark in
+the same transaction. A sync that failed between its writes and the
+rebuild leaves the mark set, so the next one rebuilds even when its delta
+is empty.
+
+An empty source, or one that would remove more than
+``--max-removed-fraction`` of the stored items, is refused rather than
+synced: that is what a missing or truncated compile looks like, and
+syncing it would wipe the masterlist. ``--allow-empty`` overrides both.
+
+Usage:
+    python masterlist_sync.py --field accommodations --source compiled
+    python masterlist_sync.py --field activities --items files/process/activities_compiled.json --dry-run
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from compile_raw import DB_PATH, RawCompiler  # noqa: E402
+from shared.instrumentation import span  # noqa: E402
+from shared.raw_store import iter_items  # noqa: E402
+from shared.supabase_rest import SupabaseRest, in_filter  # noqa: E402
+
+ITEMS_TABLE = "occasion_masterlist_items"
+STATE_TABLE = "occasion_masterlist_state"
+FIELDS = ("accommodations", "activities")
+# Fields that vary between identical search results and must not trigger a write.
+VOLATILE_FIELDS = frozenset({"search_query", "search_date", "distance_km", "fetched_at"})
+MAX_CHUNK_ROWS = 500
+MAX_CHUNK_BYTES = 1024 * 1024
+MAX_DELETE_IDS = 200
+# Share of the stored items a single sync may remove before it is refused.
+MAX_REMOVED_FRACTION = 0.5
+
+
+class UnsafeSync(ValueError):
+    """The delta looks like a missing or truncated source; nothing was written."""
+
+    def __init__(self, message: str, result: dict):
+        super().__init__(message)
+        self.result = result
+
+
+def content_hash(item: dict) -> str:
+    stable = {k: v for k, v in item.items() if k not in VOLATILE_FIELDS}
+    text = json.dumps(stable, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+@dataclass
+class Delta:
+    added: set[str] = field(default_factory=set)
+    changed: set[str] = field(default_factory=set)
+    removed: set[str] = field(default_factory=set)
+    unchanged: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def summary(self) -> dict:
+        return {
+            "added": len(self.added),
+            "changed": len(self.changed),
+            "removed": len(self.removed),
+            "unchanged": self.unchanged,
+        }
+
+
+def compute_delta(local: dict[str, str], remote: dict[str, str]) -> Delta:
+    """Compare ``id -> hash`` maps of local results and the stored masterlist."""
+    delta = Delta()
+    for item_id, digest in local.items():
+        stored = remote.get(item_id)
+        if stored is None:
+            delta.added.add(item_id)
+        elif stored != digest:
+            delta.changed.add(item_id)
+        else:
+            delta.unchanged += 1
+    delta.removed = set(remote) - set(local)
+    return delta
+
+
+def chunk_rows(rows: Iterable[dict], max_rows: int = MAX_CHUNK_ROWS, max_bytes: int = MAX_CHUNK_BYTES) -> Iterator[list[dict]]:
+    """Group rows into batches bounded by count and serialized size."""
+    batch: list[dict] = []
+    size = 0
+    for row in rows:
+        row_size = len(json.dumps(row, separators=(",", ":"), ensure_ascii=False).encode())
+        if batch and (len(batch) >= max_rows or size + row_size > max_bytes):
+            yield batch
+            batch, size = [], 0
+        batch.append(row)
+        size += row_size
+    if batch:
+        yield batch
+
+
+def _dedupe(items: Iterable[dict]) -> Iterator[dict]:
+    """Drop repeated ids; a batch may not upsert the same row twice."""
+    seen: set[str] = set()
+    for item in items:
+        if item.get("id") in seen:
+            continue
+        seen.add(item.get("id"))
+        yield item
+
+
+class MasterlistSync:
+    def __init__(self, client: SupabaseRest, occasion_id: str):
+        self.client = client
+        self.occasion_id = occasion_id
+
+    def _filters(self, field_name: str) -> dict[str, str]:
+        return {"occasion_id": f"eq.{self.occasion_id}", "field": f"eq.{field_name}"}
+
+    def remote_hashes(self, field_name: str) -> dict[str, str]:
+        rows = self.client.select(
+            ITEMS_TABLE, self._filters(field_name), columns="item_id,content_hash", order="item_id"
+        )
+        return {row["item_id"]: row["content_hash"] for row in rows}
+
+    def pending(self, field_name: str) -> bool:
+        """Whether an earlier sync wrote items but never got to the rebuild."""
+        rows = self.client.select(STATE_TABLE, self._filters(field_name), columns="pending")
+        return any(row.get("pending") for row in rows)
+
+    def _mark_pending(self, field_name: str) -> None:
+        self.client.upsert(
+            STATE_TABLE,
+            [{"occasion_id": self.occasion_id, "field": field_name, "pending": True}],
+            on_conflict="occasion_id,field",
+        )
+
+    def sync(
+        self,
+        field_name: str,
+        source: Callable[[], Iterator[dict]],
+        dry_run: bool = False,
+        allow_empty: bool = False,
+        max_removed_fraction: float = MAX_REMOVED_FRACTION,
+    ) -> dict:
+        """Push the delta between ``source()`` and the stored masterlist.
+
+        ``source`` is called twice (hash pass, then upload pass) so items are
+        streamed rather than held in memory. Raises ``UnsafeSync`` before
+        writing anything when the source is empty or would remove more than
+        ``max_removed_fraction`` of the stored items, unless ``allow_empty``.
+        """
+        if field_name not in FIELDS:
+            raise ValueError(f"unknown masterlist field: {field_name}")
+
+        local = {str(item["id"]): content_hash(item) for item in _dedupe(source()) if item.get("id")}
+        remote = self.remote_hashes(field_name)
+        delta = compute_delta(local, remote)
+        pending = self.pending(field_name)
+        result = {
+            "field": field_name,
+            **delta.summary(),
+            "upsert_batches": 0,
+            "delete_batches": 0,
+            "pending": pending,
+            "rebuilt": False,
+        }
+        unsafe = None
+        if remote and not local:
+            unsafe = f"source has no {field_name} but {len(remote)} are stored"
+        elif len(delta.removed) > max_removed_fraction * len(remote):
+            unsafe = f"would remove {len(delta.removed)} of {len(remote)} stored {field_name}"
+        if unsafe and not allow_empty:
+            if dry_run:
+                return {**result, "unsafe": unsafe}
+            raise UnsafeSync(unsafe, result)
+        if dry_run or not (delta or pending):
+            return result
+
+        if delta and not pending:
+            self._mark_pending(field_name)
+        dirty = delta.added | delta.changed
+        rows = (
+            {
+                "occasion_id": self.occasion_id,
+                "field": field_name,
+                "item_id": str(item["id"]),
+                "content_hash": local[str(item["id"])],
+                "item": item,
+            }
+            for item in _dedupe(source())
+            if str(item.get("id")) in dirty
+        )
+        for batch in chunk_rows(rows):
+            self.client.upsert(ITEMS_TABLE, batch, on_conflict="occasion_id,field,item_id")
+            result["upsert_batches"] += 1
+
+        removed = sorted(delta.removed)
+        for start in range(0, len(removed), MAX_DELETE_IDS):
+            ids = removed[start:start + MAX_DELETE_IDS]
+            self.client.delete(ITEMS_TABLE, {**self._filters(field_name), "item_id": in_filter(ids)})
+            result["delete_batches"] += 1
+
+        result["masterlist_count"] = self.client.rpc(
+            "rebuild_masterlist", {"p_occasion_id": self.occasion_id, "p_field": field_name}
+        )
+        result["rebuilt"] = True
+        return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Send only the masterlist delta to Supabase")
+    parser.add_argument("--field", required=True, choices=FIELDS)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--source", choices=["compiled"], help="Read items from compile_raw.py's store")
+    group.add_argument("--items", type=Path, help="JSON/JSONL file with the final items")
+    parser.add_argument("--occasion-id", help="Defaults to files/process/occasion_context.json")
+    parser.add_argument("--files-dir", type=Path, default=Path("files"))
+    parser.add_argument("--dry-run", action="store_true", help="Report the delta without writing")
+    parser.add_argument("--allow-empty", action="store_true", help="Sync even an empty or mostly-removed source")
+    parser.add_argument("--max-removed-fraction", type=float, default=MAX_REMOVED_FRACTION)
+    args = parser.parse_args()
+
+    occasion_id = args.occasion_id
+    if not occasion_id:
+        occasion_id = json.loads((args.files_dir / "process" / "occasion_context.json").read_text())["id"]
+
+    compiler = None
+    if args.items:
+        def source() -> Iterator[dict]:
+            return iter_items(args.items)
+    else:
+        compiler = RawCompiler(args.files_dir / DB_PATH.relative_to("files"))
+
+        def source() -> Iterator[dict]:
+            return compiler.iter_compiled(args.field)
+
+    try:
+        with span(f"inventory.{args.field}.sync") as attrs:
+            result = MasterlistSync(SupabaseRest(), occasion_id).sync(
+                args.field,
+                source,
+                dry_run=args.dry_run,
+                allow_empty=args.allow_empty,
+                max_removed_fraction=args.max_removed_fraction,
+            )
+            attrs["items"] = result["added"] + result["changed"] + result["unchanged"]
+            attrs["written"] = 0 if args.dry_run else result["added"] + result["changed"] + result["removed"]
+    except UnsafeSync as error:
+        print(json.dumps({"success": False, "occasion_id": occasion_id, "error": str(error), **error.result}, indent=2))
+        return 1
+    finally:
+        if compiler is not None:
+            compiler.close()
+    print(json.dumps({"success": True, "occasion_id": occasion_id, **result}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Build or query the occasion's precomputed travel-time matrix.
+
+``build`` computes hotel x activity and activity x activity travel times
+once, in batched Distance Matrix requests (road-factor estimates fill any
+gaps), and stores them next to the masterlist. ``lookup`` answers a pair
+from that file without any API call, which is what verification and
+revision use instead of ``get_directions.py`` for schedule checks.
+
+Usage:
+    python travel_matrix.py build
+    python travel_matrix.py build --estimate-only --mode walking
+    python travel_matrix.py lookup --from lp98c79 --to ChIJvyiy5iAPKhMRK53gqfYvWJM
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+
+from shared.api_client import pooled_session  # noqa: E402
+from shared.instrumentation import span  # noqa: E402
+from shared.maps_client import MapsClient  # noqa: E402
+from shared.travel_matrix import TravelMatrix, points_from_masterlists  # noqa: E402
+
+OCCASION_CONTEXT = Path("files/process/occasion_context.json")
+MATRIX_PATH = Path("files/process/travel_matrix.npz")
+
+
+def load_activities(data) -> list[dict]:
+    """Accept a flat masterlist or the inventory ``categories[].places`` layout."""
+    if isinstance(data, dict) and "categories" in data:
+        return [place for category in data["categories"] for place in category.get("places", [])]
+    return data
+
+
+def cmd_build(args) -> dict:
+    context = json.loads(args.occasion_context.read_text())
+    accommodations = context.get("accommodations") or []
+    activities = load_activities(context.get("activities") or [])
+    if args.accommodations:
+        data = json.loads(args.accommodations.read_text())
+        accommodations = data.get("hotels", []) if isinstance(data, dict) else data
+    if args.activities:
+        activities = load_activities(json.loads(args.activities.read_text()))
+
+    points = points_from_masterlists(accommodations, activities)
+    client = None if args.estimate_only else MapsClient(session=pooled_session(args.workers))
+    with span("planning.travel_matrix") as attrs:
+        matrix = TravelMatrix.build(
+            points, client=client, mode=args.mode, workers=args.workers, meta={"occasion_id": context.get("id")}
+        )
+        matrix.save(args.output)
+        attrs["items"] = int(matrix.seconds.size)
+    return {
+        "success": True,
+        "output": str(args.output),
+        "bytes": args.output.stat().st_size,
+        "origins": len(matrix.ids),
+        "destinations": len(matrix.dest_ids),
+        **matrix.meta,
+    }
+
+
+def cmd_lookup(args) -> dict:
+    matrix = TravelMatrix.load(args.output)
+    return {"from": args.origin, "to": args.destination, **matrix.lookup(args.origin, args.destination)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Precomputed travel-time matrix for an occasion")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Compute and store the matrix")
+    build.add_argument("--occasion-context", type=Path, default=OCCASION_CONTEXT)
+    build.add_argument("--accommodations", type=Path, help="Override hotels (list or {'hotels': [...]})")
+    build.add_argument("--activities", type=Path, help="Override activities (list or categories layout)")
+    build.add_argument("--mode", default="driving", choices=["driving", "walking", "bicycling", "transit"])
+    build.add_argument("--estimate-only", action="store_true", help="Skip the API; haversine x road factor only")
+    build.add_argument("--workers", type=int, default=4)
+    build.add_argument("--output", type=Path, default=MATRIX_PATH)
+
+    lookup = sub.add_parser("lookup", help="Travel time between two masterlist ids")
+    lookup.add_argument("--from", dest="origin", required=True)
+    lookup.add_argument("--to", dest="destination", required=True)
+    lookup.add_argument("--output", type=Path, default=MATRIX_PATH)
+
+    args = parser.parse_args()
+    try:
+        result = cmd_build(args) if args.command == "build" else cmd_lookup(args)
+    except KeyError as error:
+        print(json.dumps({"success": False, "error": str(error)}))
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
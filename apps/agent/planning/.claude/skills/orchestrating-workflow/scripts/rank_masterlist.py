@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Rank an occasion masterlist against a user's preferences.
+
+The feature table for each masterlist is built once and stored in
+``files/process/features_<field>.npz``; every later call for the same
+occasion (any user) reuses it until the masterlist or venue changes.
+Several users can be ranked in one call by passing ``--user-context``
+more than once.
+
+Usage:
+    python rank_masterlist.py --field accommodations -k 3
+    python rank_masterlist.py --field activities -k 20 --venue 43.4689,10.7385
+    python rank_masterlist.py --field accommodations --user-context a.json --user-context b.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+
+from shared.instrumentation import span  # noqa: E402
+from shared.ranking import FEATURES, FeatureTable, parse_preferences, top_k  # noqa: E402
+
+PROCESS_DIR = Path("files/process")
+FIELDS = ("accommodations", "activities")
+
+
+def load_items(context: dict, field: str) -> list[dict]:
+    """Flat masterlist; also accepts the inventory ``categories[].places`` layout."""
+    data = context.get(field) or []
+    if isinstance(data, dict) and "categories" in data:
+        return [dict(place, category=c.get("name")) for c in data["categories"] for place in c.get("places", [])]
+    if isinstance(data, dict):
+        return data.get("hotels", [])
+    return data
+
+
+def resolve_venue(context: dict, venue: str | None) -> tuple[float, float] | None:
+    """``--venue lat,lon``, else geocode ``full_address`` (cached), else None."""
+    if venue:
+        lat, lon = venue.split(",")
+        return float(lat), float(lon)
+    if not context.get("full_address"):
+        return None
+    try:
+        from shared.maps_client import MapsClient
+
+        results = MapsClient().geocode(context["full_address"]).get("results") or []
+    except Exception:
+        return None
+    if not results:
+        return None
+    location = results[0]["geometry"]["location"]
+    return float(location["lat"]), float(location["lng"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Top-k masterlist items for user preferences")
+    parser.add_argument("--field", required=True, choices=FIELDS)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--occasion-context", type=Path, default=PROCESS_DIR / "occasion_context.json")
+    parser.add_argument("--user-context", type=Path, action="append", help="Repeat to rank several users")
+    parser.add_argument("--venue", help="lat,lon of the venue (default: geocode full_address)")
+    parser.add_argument("--features", type=Path, help="Feature table path (default: files/process/features_<field>.npz)")
+    args = parser.parse_args()
+
+    context = json.loads(args.occasion_context.read_text())
+    items = load_items(context, args.field)
+    if not items:
+        print(json.dumps({"success": False, "error": f"occasion has no {args.field} masterlist"}))
+        return 1
+
+    features_path = args.features or PROCESS_DIR / f"features_{args.field}.npz"
+    users = [json.loads(p.read_text()) for p in args.user_context or [PROCESS_DIR / "user_context.json"]]
+    with span("planning.ranking", items=len(users)):
+        table = FeatureTable.cached(items, features_path, venue=resolve_venue(context, args.venue))
+        prefs = [parse_preferences(u.get("preferences") or "") for u in users]
+        scores = table.score_many(prefs)
+
+    results = []
+    for user, user_prefs, row_scores in zip(users, prefs, scores):
+        ranked = []
+        for row, score in top_k(row_scores, args.k):
+            item = items[row]
+            ranked.append({
+                "id": item.get("id"),
+                "name": item.get("name"),
+                "score": round(score, 4),
+                "distance_km": None if table.distance_km[row] != table.distance_km[row] else round(float(table.distance_km[row]), 2),
+                "features": dict(zip(FEATURES, (round(float(v), 3) for v in table.features[row]))),
+            })
+        results.append({
+            "user_id": user.get("id"),
+            "eligible": int((row_scores > float("-inf")).sum()),
+            "ignored_requirements": table.unmatched(user_prefs),
+            "budget": user_prefs.budget,
+            "min_stars": user_prefs.min_stars,
+            "top": ranked,
+        })
+
+    print(json.dumps({
+        "success": True,
+        "field": args.field,
+        "candidates": len(table),
+        "features": str(features_path),
+        "digest": table.digest,
+        "users": results,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""Patch the day-by-day plan for a revision instead of regenerating it.
+
+The revised ``transportation``/``accommodation``/``activities`` (from
+``files/content/<field>/``) are diffed against ``existing_plan`` in
+``revision_context.json``. Only the plan slots that depend on a changed
+item are rewritten:
+
+- a removed activity's slot takes an added activity (same type first) or
+  is dropped; leftover additions go to the lightest day
+- a hotel change renames check-in/out items and re-times each day's first
+  leg from the hotel
+- a flight change re-times the arrival/departure day
+
+Each touched day is then re-verified from its first dirty slot onward,
+with travel times from ``travel_matrix.npz`` (road-factor estimate for
+pairs outside it), and later items are shifted when a leg no longer fits.
+The ``change_log`` entry records the item diff plus the list of plan
+operations, not a copy of the plan.
+
+Usage:
+    python revise_plan.py
+    python revise_plan.py --activities files/content/activities/revised.json --output patch.json
+    python revise_plan.py --apply
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+
+from shared.instrumentation import span  # noqa: E402
+from shared.travel_matrix import TravelMatrix, estimate  # noqa: E402
+
+CONTEXT_PATH = Path("files/process/revision_context.json")
+MATRIX_PATH = Path("files/process/travel_matrix.npz")
+CONTENT_DIR = Path("files/content")
+FIELDS = ("transportation", "accommodation", "activities")
+# Default minutes an item occupies when it has no ``duration_min``.
+DEFAULT_DURATION = {"activity": 90, "accommodation": 30, "transportation": 60}
+TIME_STEP_MIN = 5
+
+
+def _as_list(value: Any) -> list[dict]:
+    """Selected items of a field, whatever wrapper the subagent wrote."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, dict)]
+    for key in ("selected", "options", "hotels", "activities", "items"):
+        if isinstance(value.get(key), list):
+            return _as_list(value[key])
+    return [value] if value.get("id") else []
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(":")[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def _hhmm(minutes: int) -> str:
+    minutes = min(minutes, 24 * 60 - 1)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+@dataclass
+class FieldDiff:
+    added: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    changed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+    def as_dict(self) -> dict:
+        return {"added": self.added, "removed": self.removed, "changed": self.changed}
+
+
+def diff_items(old: list[dict], new: list[dict]) -> FieldDiff:
+    """Id-keyed diff of two selections, order-preserving."""
+    before = {str(i["id"]): _digest(i) for i in old if i.get("id")}
+    after = {str(i["id"]): _digest(i) for i in new if i.get("id")}
+    return FieldDiff(
+        added=[k for k in after if k not in before],
+        removed=[k for k in before if k not in after],
+        changed=[k for k in after if k in before and before[k] != after[k]],
+    )
+
+
+def diff_transportation(old: Any, new: Any) -> dict[str, bool]:
+    """Which legs changed; a flat value counts as both."""
+    old, new = old or {}, new or {}
+    legs = {}
+    for leg in ("outbound", "return"):
+        if isinstance(old, dict) and isinstance(new, dict) and (leg in old or leg in new):
+            legs[leg] = _digest(old.get(leg)) != _digest(new.get(leg))
+    if not legs:
+        changed = _digest(old) != _digest(new)
+        legs = {"outbound": changed, "return": changed}
+    return legs
+
+
+class PlanEditor:
+    """Applies item-level edits to ``plan`` and records them as patch operations."""
+
+    def __init__(self, plan: dict):
+        self.plan = plan
+        self.ops: list[dict] = []
+        self.dirty: set[int] = set()  # id() of items whose inbound leg must be re-verified
+        self.changed: set[int] = set()  # id() of items whose place or time changed (outbound leg too)
+        self._op_for: dict[int, dict] = {}  # id() of an item this patch wrote -> the op that wrote it
+
+    def items(self, day: int) -> list[dict]:
+        return self.plan["days"][day].setdefault("items", [])
+
+    def replace(self, day: int, index: int, item: dict) -> None:
+        items = self.items(day)
+        op = self._op_for.pop(id(items[index]), None)
+        if op is not None:
+            op["value"] = item  # a follow-up edit of a slot this patch wrote stays one operation
+        else:
+            op = {"op": "replace", "path": f"/days/{day}/items/{index}", "value": item, "previous": items[index]}
+            self.ops.append(op)
+        self._op_for[id(item)] = op
+        items[index] = item
+        self.dirty.add(id(item))
+        self.changed.add(id(item))
+
+    def insert(self, day: int, item: dict) -> None:
+        items = self.items(day)
+        index = next((i for i, it in enumerate(items) if _minutes(it.get("time", "00:00")) > _minutes(item["time"])), len(items))
+        items.insert(index, item)
+        self.ops.append({"op": "add", "path": f"/days/{day}/items/{index}", "value": item})
+        self._op_for[id(item)] = self.ops[-1]
+        self.dirty.add(id(item))
+        self.changed.add(id(item))
+
+    def remove(self, day: int, index: int) -> None:
+        items = self.items(day)
+        removed = items.pop(index)
+        self.ops.append({"op": "remove", "path": f"/days/{day}/items/{index}", "previous": removed})
+        if index < len(items):
+            self.dirty.add(id(items[index]))  # its inbound leg changed
+
+    def mark(self, item: dict) -> None:
+        self.dirty.add(id(item))
+
+    def set(self, path: tuple[str, ...], value: Any) -> None:
+        """Set a plan-level field (e.g. ``("summary", "activities")``), recorded like item edits.
+
+        JSON Patch cannot add below a missing member, so when a parent object
+        is missing (or not an object) the whole branch is written in one op.
+        """
+        target = self.plan
+        for depth, key in enumerate(path[:-1]):
+            if not isinstance(target.get(key), dict):
+                for inner in reversed(path[depth + 1:]):
+                    value = {inner: value}
+                path = path[: depth + 1]
+                break
+            target = target[key]
+        pointer = "/" + "/".join(path)
+        if path[-1] in target:
+            self.ops.append({"op": "replace", "path": pointer, "value": value, "previous": target[path[-1]]})
+        else:
+            self.ops.append({"op": "add", "path": pointer, "value": value})
+        target[path[-1]] = value
+
+
+class Travel:
+    """Travel minutes between masterlist ids: matrix first, coordinates second."""
+
+    def __init__(self, matrix: TravelMatrix | None, catalog: dict[str, dict]):
+        self.matrix = matrix
+        self.catalog = catalog
+        self.lookups = 0
+
+    def minutes(self, origin: str | None, destination: str | None) -> int | None:
+        if not origin or not destination:
+            return None
+        self.lookups += 1
+        if origin == destination:
+            return 0
+        if self.matrix is not None:
+            try:
+                return -(-self.matrix.seconds_between(origin, destination) // 60)
+            except KeyError:
+                pass
+        a, b = self.catalog.get(origin), self.catalog.get(destination)
+        if not a or not b or a.get("latitude") is None or b.get("latitude") is None:
+            return None
+        mode = self.matrix.meta.get("mode", "driving") if self.matrix is not None else "driving"
+        seconds, _ = estimate(a["latitude"], a["longitude"], b["latitude"], b["longitude"], mode)
+        return -(-int(seconds) // 60)
+
+
+class PlanReviser:
+    def __init__(self, existing: dict, revised: dict, travel_matrix: TravelMatrix | None = None):
+        self.existing = existing
+        self.revised = {f: revised.get(f, existing.get(f)) for f in FIELDS}
+        self.old = {f: _as_list(existing.get(f)) for f in ("accommodation", "activities")}
+        self.new = {f: _as_list(self.revised[f]) for f in ("accommodation", "activities")}
+        catalog = {str(i["id"]): i for f in ("accommodation", "activities") for i in self.old[f] + self.new[f] if i.get("id")}
+        self.catalog = catalog
+        self.travel = Travel(travel_matrix, catalog)
+        # Longest names first, so "Place 10" is tried before "Place 1".
+        self._names = sorted(
+            ((re.compile(rf"(?<!\w){re.escape(e['name'])}(?!\w)"), item_id) for item_id, e in catalog.items() if e.get("name")),
+            key=lambda pair: -len(pair[0].pattern),
+        )
+        self._inferred: dict[int, str | None] = {}  # id() of plan items -> ref resolved from their title
+
+    def _ref(self, item: dict) -> str | None:
+        """Masterlist id an item stands for; older plans only carry the name in the title.
+
+        Resolved ids are kept here, not written into the plan: the stored plan
+        must stay equal to the previous plan plus this revision's patch.
+        """
+        if item.get("ref"):
+            return str(item["ref"])
+        if id(item) not in self._inferred:
+            title = f"{item.get('title', '')} {item.get('details', '')}"
+            self._inferred[id(item)] = next((item_id for pattern, item_id in self._names if pattern.search(title)), None)
+        return self._inferred[id(item)]
+
+    def _hotel(self, which: str) -> dict | None:
+        """Primary (first) selected hotel of the ``old`` or ``new`` selection."""
+        items = self.old["accommodation"] if which == "old" else self.new["accommodation"]
+        return items[0] if items else None
+
+    def revise(self, requests: list[str] | None = None) -> tuple[dict, dict]:
+        started = time.perf_counter()
+        plan = json.loads(json.dumps(self.existing.get("plan") or {"days": []}))
+        editor = PlanEditor(plan)
+        days = plan.get("days", [])
+
+        diffs = {f: diff_items(self.old[f], self.new[f]) for f in ("accommodation", "activities")}
+        legs = diff_transportation(self.existing.get("transportation"), self.revised["transportation"])
+
+        if diffs["activities"]:
+            self._patch_activities(editor, diffs["activities"])
+        old_hotel, new_hotel = self._hotel("old"), self._hotel("new")
+        if days and old_hotel is not None and new_hotel is not None and old_hotel.get("id") != new_hotel.get("id"):
+            self._patch_hotel(editor, old_hotel, new_hotel)
+        if days and any(legs.values()):
+            self._patch_transportation(editor, legs)
+
+        verification = self._verify(editor, new_hotel)
+        touched_days = sorted({int(op["path"].split("/")[2]) for op in editor.ops if op["path"].startswith("/days/")})
+        if editor.ops:
+            editor.set(("last_revised",), datetime.now().isoformat())
+            activities = sum(1 for day in days for item in day.get("items", []) if item.get("type") == "activity")
+            if (plan.get("summary") or {}).get("activities") != activities:
+                editor.set(("summary", "activities"), activities)
+
+        entry = {
+            "revision_id": str(uuid.uuid4()),
+            "timestamp": datetime.now().isoformat(),
+            "requests": requests or [],
+            "changes": {
+                "transportation": {leg: changed for leg, changed in legs.items()},
+                "accommodation": {
+                    **diffs["accommodation"].as_dict(),
+                    "previous": old_hotel.get("name") if old_hotel else None,
+                    "new": new_hotel.get("name") if new_hotel else None,
+                },
+                "activities": diffs["activities"].as_dict(),
+            },
+            "subagents_invoked": [f for f in FIELDS if (diffs.get(f) if f != "transportation" else any(legs.values()))]
+            + ["verification"],
+            "patch": editor.ops,
+            "affected": {"days": touched_days, "slots": len(editor.dirty), "total_days": len(days)},
+            "verification": {**verification, "seconds": round(time.perf_counter() - started, 4)},
+        }
+        return plan, entry
+
+    def _slots(self, plan: dict, ref: str) -> list[tuple[int, int]]:
+        return [
+            (d, i)
+            for d, day in enumerate(plan.get("days", []))
+            for i, item in enumerate(day.get("items", []))
+            if self._ref(item) == ref
+        ]
+
+    def _patch_activities(self, editor: PlanEditor, diff: FieldDiff) -> None:
+        plan = editor.plan
+        pending = [self.catalog[i] for i in diff.added]
+
+        for removed_id in diff.removed:
+            removed = self.catalog.get(removed_id, {})
+            for d, i in sorted(self._slots(plan, removed_id), reverse=True):
+                old_item = editor.items(d)[i]
+                match = next(
+                    (p for p in pending if set(p.get("types") or ()) & set(removed.get("types") or ())),
+                    pending[0] if pending else None,
+                )
+                if match is None:
+                    editor.remove(d, i)
+                    continue
+                pending.remove(match)
+                title = old_item.get("title", "")
+                new_title = title.replace(removed["name"], match["name"]) if removed.get("name") in title else match["name"]
+                editor.replace(d, i, {
+                    **{k: v for k, v in old_item.items() if k not in ("details", "revision_note", "travel_min")},
+                    "title": new_title,
+                    "ref": str(match["id"]),
+                    "details": match.get("address") or match.get("details", ""),
+                    "revision_note": f"Replaced {removed.get('name', removed_id)} per revision request",
+                })
+
+        for changed_id in diff.changed:
+            for d, i in self._slots(plan, changed_id):
+                editor.mark(editor.items(d)[i])
+
+        for activity in pending:
+            days = plan.get("days", [])
+            if not days:
+                break
+            middle = range(1, len(days) - 1) if len(days) > 2 else range(len(days))
+            d = min(middle, key=lambda k: sum(1 for it in days[k].get("items", []) if it.get("type") == "activity"))
+            items = editor.items(d)
+            last = items[-1] if items else None
+            start = _minutes(last["time"]) + self._duration(last) if last else 10 * 60
+            leg = self.travel.minutes(self._ref(last) if last else None, str(activity["id"])) or 0
+            editor.insert(d, {
+                "time": _hhmm(self._round(start + leg)),
+                "type": "activity",
+                "title": activity.get("name", str(activity["id"])),
+                "ref": str(activity["id"]),
+                "details": activity.get("address", ""),
+                "revision_note": "Added per revision request",
+            })
+
+    def _patch_hotel(self, editor: PlanEditor, old_hotel: dict, new_hotel: dict) -> None:
+        old_id, old_name, new_name = str(old_hotel.get("id")), old_hotel.get("name", ""), new_hotel.get("name", "")
+        for d, day in enumerate(editor.plan.get("days", [])):
+            items = day.get("items", [])
+            for i, item in enumerate(items):
+                # Slots of another hotel (second stay, already-patched slots) keep theirs.
+                if item.get("type") == "accommodation" and self._ref(item) in (old_id, None):
+                    title = item.get("title", "")
+                    editor.replace(d, i, {
+                        **item,
+                        "title": title.replace(old_name, new_name) if old_name and old_name in title else new_name,
+                        "ref": str(new_hotel["id"]),
+                        "details": new_hotel.get("address", item.get("details", "")),
+                        "revision_note": f"Changed from {old_name} per revision request",
+                    })
+            first = next((it for it in day.get("items", []) if it.get("type") == "activity"), None)
+            if first is not None:
+                editor.mark(first)  # the leg from the hotel changed
+
+    def _patch_transportation(self, editor: PlanEditor, legs: dict[str, bool]) -> None:
+        days = editor.plan["days"]
+        revised = self.revised["transportation"] if isinstance(self.revised["transportation"], dict) else {}
+        for leg, d, key in (("outbound", 0, "arrival_time"), ("return", len(days) - 1, "departure_time")):
+            if not legs.get(leg):
+                continue
+            new_time = (revised.get(leg) or {}).get(key) if isinstance(revised.get(leg), dict) else None
+            items = editor.items(d)
+            for i, item in enumerate(items):
+                if item.get("type") != "transportation":
+                    continue
+                if new_time and "T" in str(new_time) and str(new_time).startswith(days[d].get("date", "~")):
+                    editor.replace(d, i, {**item, "time": str(new_time)[11:16], "revision_note": "Flight changed per revision request"})
+                    new_time = None  # only the flight itself carries the new time
+                else:
+                    editor.mark(item)
+
+    def _duration(self, item: dict) -> int:
+        return int(item.get("duration_min") or DEFAULT_DURATION.get(item.get("type"), 60))
+
+    @staticmethod
+    def _round(minutes: int) -> int:
+        return -(-minutes // TIME_STEP_MIN) * TIME_STEP_MIN
+
+    def _verify(self, editor: PlanEditor, hotel: dict | None) -> dict:
+        """Re-check dirty slots and whatever they push later; untouched stretches are skipped."""
+        issues: list[dict] = []
+        checked = 0
+        hotel_id = str(hotel["id"]) if hotel and hotel.get("id") else None
+        for d, day in enumerate(editor.plan.get("days", [])):
+            items = day.get("items", [])
+            moved = False  # the previous slot changed, so this slot's inbound leg must be checked
+            for i in range(len(items)):
+                item = items[i]
+                if id(item) not in editor.dirty and not moved:
+                    continue
+                checked += 1
+                moved = id(item) in editor.changed  # a moved slot also changes the leg to the next one
+                prev = items[i - 1] if i > 0 else None
+                leg = self.travel.minutes(self._ref(prev) if prev else hotel_id, self._ref(item))
+                if leg is not None and item.get("type") == "activity" and item.get("travel_min") != leg:
+                    editor.replace(d, i, {**item, "travel_min": leg})
+                    item = items[i]
+                if prev is None or leg is None:
+                    continue
+                earliest = _minutes(prev["time"]) + self._duration(prev) + leg
+                if _minutes(item["time"]) >= earliest:
+                    continue
+                if item.get("type") == "transportation":
+                    issues.append({"day": d, "index": i, "kind": "conflict", "title": item.get("title"),
+                                   "needed_min": earliest - _minutes(item["time"])})
+                    continue
+                editor.replace(d, i, {**item, "time": _hhmm(self._round(earliest))})
+                issues.append({"day": d, "index": i, "kind": "shifted", "title": item.get("title"),
+                               "from": item["time"], "to": items[i]["time"]})
+                moved = True
+        return {"checked_slots": checked, "travel_lookups": self.travel.lookups, "issues": issues}
+
+
+def load_revised(content_dir: Path, overrides: dict[str, Path | None]) -> dict:
+    """Newest JSON result per field under ``files/content/<field>/`` unless a path is given."""
+    revised = {}
+    for field_name in FIELDS:
+        path = overrides.get(field_name)
+        if path is None:
+            candidates = sorted((content_dir / field_name).glob("*.json"), key=lambda p: p.stat().st_mtime)
+            path = candidates[-1] if candidates else None
+        if path is not None:
+            revised[field_name] = json.loads(path.read_text())
+    return revised
+
+
+def apply_to_supabase(user_plan_id: str, revised: dict, plan: dict, entry: dict) -> None:
+    from shared.supabase_rest import SupabaseRest
+
+    client = SupabaseRest()
+    rows = list(client.select("user_plans", {"id": f"eq.{user_plan_id}"}, columns="change_log"))
+    change_log = (rows[0].get("change_log") if rows else None) or []
+    client.update(
+        "user_plans",
+        {"id": f"eq.{user_plan_id}"},
+        {**revised, "plan": plan, "change_log": change_log + [entry], "updated_at": datetime.now().isoformat()},
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Incrementally revise a user plan")
+    parser.add_argument("--context", type=Path, default=CONTEXT_PATH)
+    parser.add_argument("--content-dir", type=Path, default=CONTENT_DIR)
+    parser.add_argument("--matrix", type=Path, default=MATRIX_PATH)
+    for field_name in FIELDS:
+        parser.add_argument(f"--{field_name}", type=Path, help=f"Revised {field_name} JSON (default: newest in content dir)")
+    parser.add_argument("--output", type=Path, default=CONTENT_DIR / "verification" / "revision_patch.json")
+    parser.add_argument("--apply", action="store_true", help="UPDATE user_plans with the patched plan and change_log entry")
+    args = parser.parse_args()
+
+    context = json.loads(args.context.read_text())
+    revised = load_revised(args.content_dir, {f: getattr(args, f) for f in FIELDS})
+    matrix = TravelMatrix.load(args.matrix) if args.matrix.exists() else None
+
+    with span("revision.revise") as attrs:
+        plan, entry = PlanReviser(context.get("existing_plan") or {}, revised, matrix).revise(context.get("requests"))
+        attrs["patch_ops"] = len(entry["patch"])
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps({"plan": plan, "change_log_entry": entry}, indent=2))
+    if args.apply:
+        with span("revision.write", items=1):
+            apply_to_supabase(context["user_plan_id"], revised, plan, entry)
+
+    print(json.dumps({
+        "success": True,
+        "output": str(args.output),
+        "applied": args.apply,
+        "operations": len(entry["patch"]),
+        **entry["affected"],
+        "issues": len(entry["verification"]["issues"]),
+        "entry_bytes": len(json.dumps(entry)),
+        "plan_bytes": len(json.dumps(plan)),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
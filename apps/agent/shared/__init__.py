@@ -0,0 +1,10 @@
+"""Helpers shared by the inventory, planning and revision agents.
+
+Skill scripts are copied into each agent's ``.claude/skills/`` tree, so code
+that has to behave identically everywhere (geometry, caching, storage
+formats) lives here instead. Scripts make it importable with::
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[5]))
+
+which resolves to ``apps/agent/`` from ``<agent>/.claude/skills/<skill>/scripts/``.
+"""
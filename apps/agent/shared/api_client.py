@@ -0,0 +1,170 @@
+"""Base HTTP client for supplier APIs, with the shared response cache in front."""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from shared.instrumentation import recorder
+from shared.response_cache import MISS, ResponseCache, credential_scope, ttl_for
+
+# Methods that may be answered from the cache; everything else always hits the server.
+CACHEABLE_METHODS = frozenset({"GET", "POST"})
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str, body: Any = None):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.body = body
+
+
+def pooled_session(pool_size: int) -> requests.Session:
+    """Session whose connection pool can serve ``pool_size`` concurrent requests per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ApiClient:
+    """JSON-over-HTTP client whose responses go through ``ResponseCache``.
+
+    Subclasses set ``DEFAULT_BASE_URL``, ``BASE_URL_ENV`` (so tests and
+    replays can point at a local server) and ``CACHE_TTLS`` (endpoint
+    prefix -> seconds). Unlisted endpoints are not cached, so a POST is only
+    served from the cache when it is a search listed there.
+    ``auth_params``/``headers`` are sent with every request and only a hash
+    of their credentials takes part in the cache key, next to ``base_url``:
+    a local fake server never serves into production runs, nor test-mode
+    credentials into live ones. ``rate_limiter`` (any object with
+    ``acquire()``) is only consulted for requests that actually go to the
+    network.
+    """
+
+    DEFAULT_BASE_URL = ""
+    BASE_URL_ENV = ""
+    CACHE_TTLS: dict[str, float] = {}
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        headers: dict[str, str] | None = None,
+        auth_params: dict[str, str] | None = None,
+        cache: ResponseCache | None = None,
+        use_cache: bool | None = None,
+        session: requests.Session | None = None,
+        rate_limiter=None,
+        timeout: float = 30.0,
+    ):
+        self.base_url = (base_url or os.environ.get(self.BASE_URL_ENV) or self.DEFAULT_BASE_URL).rstrip("/")
+        self.auth_params = auth_params or {}
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.session = session or requests.Session()
+        self.session.headers.update(headers or {})
+        self.cache_scope = credential_scope(headers, self.auth_params)
+        if use_cache is None:
+            use_cache = os.environ.get("AGENT_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+        self.cache = (cache or ResponseCache(ttls=self.CACHE_TTLS)) if use_cache else None
+
+    def request(
+        self,
+        method: str,
+        endpoint: str,
+        params: dict | None = None,
+        json_body: Any = None,
+        ttl: float | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Any:
+        """Send a request, serving it from the cache when a fresh entry exists.
+
+        ``ttl=0`` bypasses the cache for a single call (e.g. booking actions).
+        Per-call ``headers`` are not part of the cache key. Every call,
+        cached or not, is reported to ``shared.instrumentation.recorder``;
+        errors carry the call's key as ``api_call`` so retries count against it.
+        """
+        endpoint = "/" + endpoint.strip("/")
+        client = type(self).__name__
+        started = time.perf_counter()
+        if self.cache is not None and ttl is None:
+            # The client's own TTLs decide, also when a shared cache was passed in.
+            ttl = ttl_for(self.CACHE_TTLS, endpoint)
+        cacheable = self.cache is not None and ttl > 0 and method.upper() in CACHEABLE_METHODS
+        if cacheable:
+            key = self.cache.key_for(method, endpoint, params, json_body, self.base_url, self.cache_scope)
+            cached = self.cache.get(key, endpoint)
+            if cached is not MISS:
+                recorder.api_call(client, method, endpoint, time.perf_counter() - started, cache_hit=True)
+                return cached
+
+        throttled = 0.0
+        if self.rate_limiter is not None:
+            throttled = self.rate_limiter.acquire() or 0.0
+        sent = time.perf_counter()
+        try:
+            response = self.session.request(
+                method,
+                self.base_url + endpoint,
+                params={**(params or {}), **self.auth_params} or None,
+                json=json_body,
+                headers=headers,
+                timeout=self.timeout,
+            )
+        except Exception as error:
+            # Tagged so that a retry of this error is counted against this call.
+            error.api_call = recorder.api_call(
+                client, method, endpoint, time.perf_counter() - sent, error=True, throttle_seconds=throttled
+            )
+            raise
+        body = response.request.body if response.request is not None else None
+        failed = None
+        try:
+            try:
+                data = response.json() if response.content else None
+            except ValueError:
+                data = response.text
+            if response.status_code >= 400:
+                raise ApiError(response.status_code, response.reason or "request failed", data)
+            self.check_response(data)
+        except Exception as error:
+            failed = error
+            raise
+        finally:
+            call = recorder.api_call(
+                client,
+                method,
+                endpoint,
+                time.perf_counter() - sent,
+                bytes_out=len(body) if body else 0,
+                bytes_in=len(response.content or b""),
+                error=failed is not None,
+                throttle_seconds=throttled,
+            )
+            if failed is not None:
+                failed.api_call = call
+
+        if cacheable:
+            self.cache.put(key, endpoint, data, ttl)
+        return data
+
+    def check_response(self, data: Any) -> None:
+        """Raise ``ApiError`` for error payloads sent with a 2xx status."""
+
+    def get(self, endpoint: str, params: dict | None = None, ttl: float | None = None) -> Any:
+        return self.request("GET", endpoint, params=params, ttl=ttl)
+
+    def post(
+        self,
+        endpoint: str,
+        json_body: Any = None,
+        params: dict | None = None,
+        ttl: float | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Any:
+        return self.request("POST", endpoint, params=params, json_body=json_body, ttl=ttl, headers=headers)
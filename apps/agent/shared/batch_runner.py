@@ -0,0 +1,322 @@
+"""Run a workflow for many occasions (or users) in parallel processes.
+
+A pipeline is an ordered list of steps, each a command template. Every job
+(one occasion, or one user x occasion planning request) runs in its own
+worker process with its own files directory, so runs never share
+``files/process``. Progress goes to the shared ``RunLog``; a job whose
+previous run did not finish resumes after its last completed step.
+Duplicate jobs are dropped, and each job claims its run in the log first
+(``RunLog.claim``, lease renewed while a step runs), so a subject another
+worker or batch is still running is reported as ``busy`` and skipped.
+
+Pipeline file::
+
+    {"workflow": "inventory",
+     "seed": "files/occasions/{occasion_id}",
+     "steps": [{"name": "accommodation", "command": ["python", "...", "--files-dir", "{files_dir}"]}]}
+
+``seed`` (relative to the agent directory) is copied into a new run's files
+directory before its first step: the occasion's ``context/`` plus whatever
+raw ``content/`` the steps build on. A job whose seed is missing fails
+before any step runs, so nothing downstream sees an empty files dir.
+
+Placeholders: ``{occasion_id}``, ``{user_id}``, ``{run_id}``, ``{files_dir}``.
+A leading ``python``/``python3`` runs as the runner's own interpreter.
+Commands run from the agent directory with ``AGENT_RUN_ID``,
+``AGENT_RUN_DB``, ``AGENT_FILES_DIR`` and ``AGENT_STEP`` set. A step whose
+stdout (or last stdout line) is a JSON object has it recorded with the event;
+API timings from ``shared.instrumentation`` land as ``metrics`` events.
+
+Usage:
+    python -m shared.batch_runner --pipeline pipeline.json --jobs occasions.json --workers 4
+    python -m shared.batch_runner --pipeline pipeline.json --occasion-id <uuid> --occasion-id <uuid>
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+from shared.run_log import (
+    COMPLETED,
+    DB_ENV,
+    DB_PATH,
+    FAILED,
+    STARTED,
+    WORKFLOW_COMPLETED,
+    RunLog,
+    owner_id,
+    subject_key,
+)
+
+RUNS_DIR = Path("files/runs")
+OUTPUT_TAIL = 2000
+PYTHON_COMMANDS = frozenset({"python", "python3"})
+# Pseudo-step recorded when the pipeline's seed directory has been copied in.
+SEED_STEP = "seed"
+# A job's claim on its run lapses this long after the last renewal; steps renew it while they run.
+LEASE_SECONDS = 10 * 60
+
+
+@dataclass(frozen=True)
+class Job:
+    occasion_id: str
+    user_id: str | None = None
+
+    @property
+    def subject(self) -> str:
+        return subject_key(occasion_id=self.occasion_id, user_id=self.user_id)
+
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    command: tuple[str, ...]
+    timeout: float | None = None
+
+
+@dataclass(frozen=True)
+class Pipeline:
+    workflow: str
+    steps: tuple[Step, ...]
+    seed: str | None = None
+
+
+def load_pipeline(path: Path) -> Pipeline:
+    data = json.loads(path.read_text())
+    steps = tuple(Step(s["name"], tuple(s["command"]), s.get("timeout")) for s in data["steps"])
+    return Pipeline(data["workflow"], steps, data.get("seed"))
+
+
+def load_jobs(path: Path) -> list[Job]:
+    """A JSON list of occasion ids or ``{"occasion_id", "user_id"}`` objects."""
+    jobs = []
+    for entry in json.loads(path.read_text()):
+        if isinstance(entry, str):
+            jobs.append(Job(entry))
+        else:
+            jobs.append(Job(entry["occasion_id"], entry.get("user_id")))
+    return jobs
+
+
+def _expand(part: str, values: dict[str, str]) -> str:
+    """Fill known placeholders only; other braces (inline JSON, f-strings) pass through."""
+    for key, value in values.items():
+        part = part.replace("{" + key + "}", value)
+    return part
+
+
+def _command(step: Step, values: dict[str, str]) -> list[str]:
+    command = [_expand(part, values) for part in step.command]
+    if command and command[0] in PYTHON_COMMANDS:
+        command[0] = sys.executable
+    return command
+
+
+def _last_json(output: str) -> dict | None:
+    """The step's JSON result: all of stdout (scripts print indented JSON) or its last line."""
+    try:
+        value = json.loads(output)
+        return value if isinstance(value, dict) else None
+    except ValueError:
+        pass
+    for line in reversed(output.strip().splitlines()):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError:
+            return None
+        return value if isinstance(value, dict) else None
+    return None
+
+
+def _run_step(command: list[str], cwd: str, env: dict, timeout: float | None, renew) -> tuple[int, str, str]:
+    """Run one step's command, calling ``renew()`` every third of a lease while it runs."""
+    try:
+        proc = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except OSError as error:
+        return -1, "", str(error)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        wait = LEASE_SECONDS / 3
+        if deadline is not None:
+            wait = max(min(wait, deadline - time.monotonic()), 0.0)
+        try:
+            stdout, stderr = proc.communicate(timeout=wait)
+            return proc.returncode, stdout, stderr
+        except subprocess.TimeoutExpired:
+            if deadline is not None and time.monotonic() >= deadline:
+                proc.kill()
+                stdout, stderr = proc.communicate()
+                return -1, stdout, (stderr or "") + f"\ntimed out after {timeout} seconds"
+            renew()
+
+
+def run_job(
+    job: Job,
+    pipeline: Pipeline,
+    db_path: str,
+    agent_dir: str,
+    resume: bool = True,
+) -> dict:
+    """Run (or resume) one job's steps in order; executed in a worker process."""
+    started = time.perf_counter()
+    workflow, steps = pipeline.workflow, pipeline.steps
+    owner = owner_id()
+    with RunLog(db_path) as log:
+        names = ([SEED_STEP] if pipeline.seed else []) + [s.name for s in steps]
+        claimed = log.claim(workflow, job.subject, names, owner, LEASE_SECONDS, resume, {"batch": True})
+        if claimed is None:
+            return {
+                "subject": job.subject,
+                "run_id": log.latest_run(workflow, job.subject),
+                "busy": True,
+                "resumed": False,
+                "skipped": [],
+                "ran": [],
+                "failed": None,
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+        run_id, resumed = claimed
+        try:
+            done = set(log.completed_steps(run_id))
+
+            files_dir = Path(agent_dir) / RUNS_DIR / run_id / "files"
+            values = {
+                "occasion_id": job.occasion_id,
+                "user_id": job.user_id or "",
+                "run_id": run_id,
+                "files_dir": str(files_dir),
+            }
+            env = {**os.environ, "AGENT_RUN_ID": run_id, "AGENT_RUN_DB": str(db_path), "AGENT_FILES_DIR": str(files_dir)}
+
+            ran, failed = [], None
+            if pipeline.seed and SEED_STEP not in done:
+                seed = Path(agent_dir) / _expand(pipeline.seed, values)
+                if seed.is_dir():
+                    shutil.copytree(seed, files_dir, dirs_exist_ok=True)
+                    log.append(run_id, COMPLETED, SEED_STEP, {"source": str(seed)})
+                    ran.append(SEED_STEP)
+                else:
+                    log.append(
+                        run_id, FAILED, SEED_STEP, {"returncode": -1, "stderr": f"seed directory not found: {seed}"}
+                    )
+                    failed = SEED_STEP
+            (files_dir / "process").mkdir(parents=True, exist_ok=True)
+
+            for step in steps if failed is None else ():
+                if step.name in done:
+                    continue
+                log.append(run_id, STARTED, step.name, {"pid": os.getpid()})
+                step_started = time.perf_counter()
+                command = _command(step, values)
+                returncode, stdout, stderr = _run_step(
+                    command,
+                    agent_dir,
+                    {**env, "AGENT_STEP": step.name},
+                    step.timeout,
+                    lambda: log.renew(run_id, owner, LEASE_SECONDS),
+                )
+                seconds = round(time.perf_counter() - step_started, 3)
+
+                if returncode == 0:
+                    details = {"seconds": seconds, **(_last_json(stdout) or {})}
+                    log.append(run_id, COMPLETED, step.name, details)
+                    ran.append(step.name)
+                else:
+                    log.append(run_id, FAILED, step.name, {
+                        "seconds": seconds,
+                        "returncode": returncode,
+                        "stderr": stderr[-OUTPUT_TAIL:],
+                        **({"output": output} if (output := _last_json(stdout)) else {}),
+                    })
+                    failed = step.name
+                    break
+
+            if failed is None:
+                log.append(run_id, WORKFLOW_COMPLETED, None, {"steps_run": ran})
+                log.export_json(run_id, files_dir / "process" / "execution_state.json")
+            return {
+                "subject": job.subject,
+                "run_id": run_id,
+                "busy": False,
+                "resumed": resumed,
+                "skipped": sorted(done),
+                "ran": ran,
+                "failed": failed,
+                "seconds": round(time.perf_counter() - started, 3),
+            }
+        finally:
+            log.release(run_id, owner)
+
+
+def run_batch(
+    jobs: list[Job],
+    pipeline: Pipeline,
+    db_path: str | Path,
+    agent_dir: str | Path = ".",
+    workers: int = 4,
+    resume: bool = True,
+) -> dict:
+    started = time.perf_counter()
+    RunLog(db_path).close()  # create the schema once before workers race for it
+    unique = list(dict.fromkeys(jobs))  # the same subject twice would race for one run
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_job, job, pipeline, str(db_path), str(Path(agent_dir).resolve()), resume)
+            for job in unique
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+    results.sort(key=lambda r: r["subject"])
+    return {
+        "workflow": pipeline.workflow,
+        "jobs": len(unique),
+        "duplicates": len(jobs) - len(unique),
+        "completed": sum(1 for r in results if r["failed"] is None),
+        "failed": sum(1 for r in results if r["failed"] is not None),
+        "resumed": sum(1 for r in results if r["resumed"]),
+        "busy": sum(1 for r in results if r["busy"]),
+        "workers": workers,
+        "wall_seconds": round(time.perf_counter() - started, 3),
+        "sum_job_seconds": round(sum(r["seconds"] for r in results), 3),
+        "results": results,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run a workflow pipeline for many occasions in parallel")
+    parser.add_argument("--pipeline", type=Path, required=True)
+    parser.add_argument("--jobs", type=Path, help="JSON list of occasion ids or {occasion_id, user_id}")
+    parser.add_argument("--occasion-id", action="append", default=[])
+    parser.add_argument("--user-id", help="Pair every --occasion-id with this user (planning)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--db", type=Path, help="Run log (default: $AGENT_RUN_DB or files/process/runs.sqlite3)")
+    parser.add_argument("--fresh", action="store_true", help="Start new runs instead of resuming unfinished ones")
+    args = parser.parse_args()
+
+    pipeline = load_pipeline(args.pipeline)
+    jobs = load_jobs(args.jobs) if args.jobs else []
+    jobs += [Job(occasion_id, args.user_id) for occasion_id in args.occasion_id]
+    if not jobs:
+        parser.error("no jobs: pass --jobs or --occasion-id")
+
+    db_path = (args.db or Path(os.environ.get(DB_ENV) or DB_PATH)).resolve()
+    result = run_batch(jobs, pipeline, db_path, workers=args.workers, resume=not args.fresh)
+    print(json.dumps({"success": result["failed"] == 0, **result}, indent=2))
+    return 0 if result["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
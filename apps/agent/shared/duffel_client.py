@@ -0,0 +1,67 @@
+"""Duffel API client used by the duffel skill in every agent."""
+
+from __future__ import annotations
+
+import os
+
+from shared.api_client import ApiClient
+
+MINUTE = 60
+
+
+class DuffelClient(ApiClient):
+    DEFAULT_BASE_URL = "https://api.duffel.com"
+    BASE_URL_ENV = "DUFFEL_API_URL"
+    CACHE_TTLS = {
+        "/air/offer_requests": 10 * MINUTE,
+        "/air/offers": 5 * MINUTE,
+        "/air/orders": 0,
+        "/stays/search": 60 * MINUTE,
+        "/stays/quotes": 0,
+        "/stays/bookings": 0,
+        "/places/suggestions": 30 * 24 * 60 * MINUTE,
+    }
+
+    def __init__(self, api_key: str | None = None, **kwargs):
+        api_key = api_key or os.environ.get("DUFFEL_API_KEY")
+        if not api_key:
+            raise ValueError("DUFFEL_API_KEY is not set")
+        self.api_key = api_key
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Duffel-Version": "v2",
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+        }
+        super().__init__(headers=headers, **kwargs)
+
+    def search_flights(self, slices: list[dict], passengers: list[dict], cabin_class: str | None = None) -> dict:
+        data = {"slices": slices, "passengers": passengers}
+        if cabin_class:
+            data["cabin_class"] = cabin_class
+        return self.post("/air/offer_requests", {"data": data}, params={"return_offers": "true"})
+
+    def search_stays(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        check_in_date: str,
+        check_out_date: str,
+        rooms: int = 1,
+        adults: int = 2,
+    ) -> dict:
+        data = {
+            "rooms": rooms,
+            "guests": [{"type": "adult"}] * adults,
+            "check_in_date": check_in_date,
+            "check_out_date": check_out_date,
+            "location": {
+                "radius": radius_km,
+                "geographic_coordinates": {"latitude": latitude, "longitude": longitude},
+            },
+        }
+        return self.post("/stays/search", {"data": data})
+
+    def place_suggestions(self, query: str) -> dict:
+        return self.get("/places/suggestions", {"query": query})
@@ -0,0 +1,100 @@
+"""Vectorized great-circle distances and a grid index for radius queries."""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Same sphere as haversine_km, so a box edge is exactly radius_km from the centre.
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * math.pi / 180.0
+# Relative margin on the box so float rounding never cuts off a point on the circle.
+BOX_PADDING = 1e-6
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km. Arguments broadcast like NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> tuple[float, float, float, float] | None:
+    """Return ``(lat_min, lat_max, lon_min, lon_max)`` enclosing the circle.
+
+    The longitude half-width is the circle's exact extent on the sphere,
+    ``asin(sin(d) / cos(lat))``. Returns None when the circle reaches a pole
+    or crosses the antimeridian; callers should then fall back to a full
+    scan.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT * (1.0 + BOX_PADDING)
+    lat_min, lat_max = latitude - dlat, latitude + dlat
+    if lat_min <= -90.0 or lat_max >= 90.0:
+        return None
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(latitude))
+    if ratio >= 1.0:
+        return None
+    dlon = math.degrees(math.asin(ratio)) * (1.0 + BOX_PADDING)
+    lon_min, lon_max = longitude - dlon, longitude + dlon
+    if lon_min < -180.0 or lon_max > 180.0:
+        return None
+    return lat_min, lat_max, lon_min, lon_max
+
+
+class GridIndex:
+    """Bucket points into fixed-size lat/lon cells for fast radius queries.
+
+    Points are sorted by cell key once at build time; a query walks the
+    rows of the query's bounding box and slices each row's contiguous run
+    of cells with ``searchsorted``, then confirms candidates with an exact
+    haversine check.
+    """
+
+    def __init__(self, latitude: np.ndarray, longitude: np.ndarray, cell_deg: float = 0.1):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.cell_deg = cell_deg
+        self._ncols = int(math.ceil(360.0 / cell_deg)) + 1
+        keys = self._keys(self.latitude, self.longitude)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+
+    def __len__(self) -> int:
+        return len(self.latitude)
+
+    def _rows(self, latitude) -> np.ndarray:
+        return np.floor((np.asarray(latitude) + 90.0) / self.cell_deg).astype(np.int64)
+
+    def _cols(self, longitude) -> np.ndarray:
+        return np.floor((np.asarray(longitude) + 180.0) / self.cell_deg).astype(np.int64)
+
+    def _keys(self, latitude, longitude) -> np.ndarray:
+        # Points without coordinates get key -1 and never fall inside a query box.
+        valid = np.isfinite(latitude) & np.isfinite(longitude)
+        lat = np.where(valid, latitude, 0.0)
+        lon = np.where(valid, longitude, 0.0)
+        return np.where(valid, self._rows(lat) * self._ncols + self._cols(lon), -1)
+
+    def candidates(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """Indices of points inside the query's bounding box (unsorted)."""
+        box = bounding_box(latitude, longitude, radius_km)
+        if box is None:
+            return np.arange(len(self), dtype=np.int64)
+        lat_min, lat_max, lon_min, lon_max = box
+        row_lo, row_hi = int(self._rows(lat_min)), int(self._rows(lat_max))
+        col_lo, col_hi = int(self._cols(lon_min)), int(self._cols(lon_max))
+        rows = np.arange(row_lo, row_hi + 1, dtype=np.int64)
+        starts = np.searchsorted(self._sorted_keys, rows * self._ncols + col_lo, side="left")
+        stops = np.searchsorted(self._sorted_keys, rows * self._ncols + col_hi, side="right")
+        slices = [self._order[a:b] for a, b in zip(starts, stops) if b > a]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def query_radius(self, latitude: float, longitude: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Return ``(indices, distances_km)`` of points within ``radius_km``."""
+        idx = self.candidates(latitude, longitude, radius_km)
+        dist = haversine_km(latitude, longitude, self.latitude[idx], self.longitude[idx])
+        keep = dist <= radius_km
+        return idx[keep], dist[keep]
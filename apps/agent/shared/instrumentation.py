@@ -0,0 +1,257 @@
+"""Per-step and per-API-call timing shared by every agent's scripts.
+
+``ApiClient`` reports each request (latency, status, bytes sent and
+received, cache hit, time spent waiting on the rate limiter),
+``retry_with_backoff`` reports retries, and scripts wrap their stages in
+``span("<step>")``. Calls are attributed to the innermost open span.
+Latencies go into fixed log-scale histograms, so the summary stays small
+and processes can be merged by adding bucket counts.
+
+When a script runs as a batch step (``AGENT_RUN_ID`` set by
+``shared/batch_runner.py``), the summary is appended to that run's event
+log as a ``metrics`` event on exit; ``AGENT_METRICS_PATH`` additionally
+appends it to a JSONL file.
+
+Usage:
+    from shared.instrumentation import recorder, span
+
+    with span("accommodation.compile", files=3) as attrs:
+        attrs["items"] = compile_everything()
+    print(recorder.summary())
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+# Upper bounds (ms) of the latency buckets, ~1.5x apart; one extra bucket catches the rest.
+LATENCY_BUCKETS_MS = (
+    1, 1.5, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750,
+    1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000,
+)
+METRICS_EVENT = "metrics"
+_ID_SEGMENT = re.compile(r"^(?=.*\d)[A-Za-z0-9_\-]{8,}$")
+
+
+def endpoint_key(endpoint: str) -> str:
+    """Group endpoints by route: id-like path segments become ``:id``."""
+    parts = [":id" if _ID_SEGMENT.match(p) else p for p in endpoint.split("?")[0].split("/")]
+    return "/".join(parts)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = float("inf")
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.min_ms = min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """The ``q`` quantile, interpolated linearly inside the bucket that holds it.
+
+        Bucket edges are clamped to the observed min and max, so a quantile
+        moves with the latencies inside a bucket instead of snapping to its
+        upper bound.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = max(LATENCY_BUCKETS_MS[i - 1] if i else 0.0, self.min_ms)
+                upper = min(LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms, self.max_ms)
+                return round(lower + (upper - lower) * max(rank - seen, 0.0) / n, 3)
+            seen += n
+        return self.max_ms
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "min_ms": round(self.min_ms, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets_ms": {
+                (str(b) if i < len(LATENCY_BUCKETS_MS) else "inf"): n
+                for i, (b, n) in enumerate(zip(LATENCY_BUCKETS_MS + (None,), self.counts))
+                if n
+            },
+        }
+
+
+class CallStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.throttle_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.latency.count,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "retries": self.retries,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "throttle_seconds": round(self.throttle_seconds, 3),
+            "latency": self.latency.as_dict(),
+        }
+
+
+class Recorder:
+    """Thread-safe, process-wide collector of step spans and API call stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.steps: dict[str, dict] = {}
+            self.api: dict[tuple[str, str], CallStats] = {}
+            self._stack: list[str] = []
+
+    @property
+    def current_step(self) -> str:
+        # Steps are sequential within a process; worker threads inherit the open span.
+        return self._stack[-1] if self._stack else os.environ.get("AGENT_STEP", "-")
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[dict]:
+        """Time a step; the yielded dict is stored with it (e.g. item counts)."""
+        with self._lock:
+            self._stack.append(name)
+        started = time.perf_counter()
+        error = None
+        try:
+            yield attrs
+        except BaseException as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            with self._lock:
+                self._stack.remove(name)
+                step = self.steps.setdefault(name, {"runs": 0, "seconds": 0.0, "errors": 0, "attrs": {}})
+                step["runs"] += 1
+                step["seconds"] += seconds
+                step["errors"] += error is not None
+                step["attrs"].update(attrs)
+
+    def _stats(self, key: tuple[str, str]) -> CallStats:
+        stats = self.api.get(key)
+        if stats is None:
+            stats = self.api[key] = CallStats()
+        return stats
+
+    def api_call(
+        self,
+        client: str,
+        method: str,
+        endpoint: str,
+        seconds: float,
+        bytes_out: int = 0,
+        bytes_in: int = 0,
+        cache_hit: bool = False,
+        error: bool = False,
+        throttle_seconds: float = 0.0,
+    ) -> tuple[str, str]:
+        """Record one call; returns its ``(step, call)`` key for ``retry``."""
+        key = (self.current_step, f"{client} {method} {endpoint_key(endpoint)}")
+        with self._lock:
+            stats = self._stats(key)
+            stats.latency.observe(seconds * 1000.0)
+            stats.bytes_out += bytes_out
+            stats.bytes_in += bytes_in
+            stats.cache_hits += cache_hit
+            stats.errors += error
+            stats.throttle_seconds += throttle_seconds
+        return key
+
+    def retry(self, error: Exception) -> None:
+        """Count a retry against the call that failed with ``error``.
+
+        ``ApiClient`` tags its errors with the call's key (``error.api_call``);
+        errors raised elsewhere count against the current step's ``-`` entry.
+        """
+        key = getattr(error, "api_call", None) or (self.current_step, "-")
+        with self._lock:
+            self._stats(key).retries += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            api: dict[str, dict] = {}
+            for (step, call), stats in sorted(self.api.items()):
+                api.setdefault(step, {})[call] = stats.as_dict()
+            steps = {
+                name: {**step, "seconds": round(step["seconds"], 4)} for name, step in self.steps.items()
+            }
+            totals = CallStats()
+            for stats in self.api.values():
+                totals.errors += stats.errors
+                totals.cache_hits += stats.cache_hits
+                totals.retries += stats.retries
+                totals.bytes_out += stats.bytes_out
+                totals.bytes_in += stats.bytes_in
+                totals.throttle_seconds += stats.throttle_seconds
+                for i, n in enumerate(stats.latency.counts):
+                    totals.latency.counts[i] += n
+                totals.latency.count += stats.latency.count
+                totals.latency.total_ms += stats.latency.total_ms
+                totals.latency.min_ms = min(totals.latency.min_ms, stats.latency.min_ms)
+                totals.latency.max_ms = max(totals.latency.max_ms, stats.latency.max_ms)
+        return {"steps": steps, "api": api, "totals": totals.as_dict()}
+
+    def flush(self, run_id: str | None = None, db_path: str | None = None) -> dict | None:
+        """Append the summary to the run log and/or ``AGENT_METRICS_PATH``; no-op when empty."""
+        summary = self.summary()
+        if not summary["steps"] and not summary["totals"]["calls"] and not summary["totals"]["retries"]:
+            return None
+        run_id = run_id or os.environ.get("AGENT_RUN_ID")
+        if run_id:
+            from shared.run_log import RunLog
+
+            with RunLog(db_path or os.environ.get("AGENT_RUN_DB")) as log:
+                log.append(run_id, METRICS_EVENT, os.environ.get("AGENT_STEP"), summary)
+        path = os.environ.get("AGENT_METRICS_PATH")
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps({"run_id": run_id, "step": os.environ.get("AGENT_STEP"), **summary}) + "\n")
+        return summary
+
+
+recorder = Recorder()
+span = recorder.span
+
+
+@atexit.register
+def _flush_at_exit() -> None:
+    if os.environ.get("AGENT_RUN_ID") or os.environ.get("AGENT_METRICS_PATH"):
+        try:
+            recorder.flush()
+        except Exception:
+            pass  # metrics must never turn a finished step into a failure
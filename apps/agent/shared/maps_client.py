@@ -0,0 +1,84 @@
+"""Google Maps Platform client used by the google-maps skill in every agent."""
+
+from __future__ import annotations
+
+import os
+from typing import Any
+
+from shared.api_client import ApiClient, ApiError
+
+DAY = 24 * 60 * 60
+
+# Statuses that mean "the request worked"; anything else is not cached.
+OK_STATUSES = frozenset({"OK", "ZERO_RESULTS"})
+
+
+class MapsClient(ApiClient):
+    DEFAULT_BASE_URL = "https://maps.googleapis.com"
+    BASE_URL_ENV = "GOOGLE_MAPS_API_URL"
+    CACHE_TTLS = {
+        "/maps/api/place/details": 30 * DAY,
+        "/maps/api/place/textsearch": 7 * DAY,
+        "/maps/api/place/nearbysearch": 7 * DAY,
+        "/maps/api/geocode": 30 * DAY,
+        "/maps/api/directions": DAY,
+        "/maps/api/distancematrix": DAY,
+    }
+
+    def __init__(self, api_key: str | None = None, **kwargs):
+        api_key = api_key or os.environ.get("GOOGLE_MAPS_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_MAPS_API_KEY is not set")
+        self.api_key = api_key
+        super().__init__(auth_params={"key": api_key}, **kwargs)
+
+    def check_response(self, data: Any) -> None:
+        status = data.get("status") if isinstance(data, dict) else None
+        if status is not None and status not in OK_STATUSES:
+            raise ApiError(429 if status == "OVER_QUERY_LIMIT" else 400, status, data)
+
+    def text_search(
+        self,
+        query: str,
+        latitude: float | None = None,
+        longitude: float | None = None,
+        radius_m: int | None = None,
+        page_token: str | None = None,
+        follow_pages: bool = False,
+    ) -> dict:
+        """One page of a text search.
+
+        Pass ``follow_pages`` when the caller will request further pages: the
+        first page is then fetched live, because a cached copy would carry a
+        ``next_page_token`` that has long expired.
+        """
+        params: dict[str, Any] = {"query": query}
+        if latitude is not None and longitude is not None:
+            params["location"] = f"{latitude:.6f},{longitude:.6f}"
+        if radius_m:
+            params["radius"] = int(radius_m)
+        if page_token:
+            # Page tokens are single-use and short-lived; never serve them from cache.
+            return self.get("/maps/api/place/textsearch/json", {"pagetoken": page_token}, ttl=0)
+        return self.get("/maps/api/place/textsearch/json", params, ttl=0 if follow_pages else None)
+
+    def place_details(self, place_id: str, fields: list[str] | None = None) -> dict:
+        params = {"place_id": place_id}
+        if fields:
+            params["fields"] = ",".join(sorted(fields))
+        return self.get("/maps/api/place/details/json", params)
+
+    def geocode(self, address: str) -> dict:
+        return self.get("/maps/api/geocode/json", {"address": address})
+
+    def directions(self, origin: str, destination: str, mode: str = "driving", departure_time: str | None = None) -> dict:
+        params = {"origin": origin, "destination": destination, "mode": mode}
+        if departure_time:
+            params["departure_time"] = departure_time
+        return self.get("/maps/api/directions/json", params)
+
+    def distance_matrix(self, origins: list[str], destinations: list[str], mode: str = "driving") -> dict:
+        return self.get(
+            "/maps/api/distancematrix/json",
+            {"origins": "|".join(origins), "destinations": "|".join(destinations), "mode": mode},
+        )
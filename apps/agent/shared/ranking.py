@@ -0,0 +1,333 @@
+"""Vectorized preference ranking over occasion masterlists.
+
+A ``FeatureTable`` is built once per masterlist. It holds numeric columns
+(rating, rating_count, stars, price_level, proximity to the venue) plus a
+packed bitset of tokens drawn from ``facility_ids``, ``types``,
+``amenities`` and category words. Preferences parsed from a user's
+markdown become a weight vector, hard-filter masks and an interest mask.
+Scoring every candidate for one user, or for a whole batch of users at
+once, is then a few array operations over the shared table.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from shared.geo import haversine_km
+
+# Column order of FeatureTable.features.
+FEATURES = ("rating", "popularity", "stars", "price", "proximity")
+
+# Preference keyword -> tokens an item may carry for it.
+TOKEN_SYNONYMS = {
+    "gym": {"gym", "fitness", "fitness_center"},
+    "pool": {"pool", "swimming_pool"},
+    "spa": {"spa", "wellness"},
+    "parking": {"parking"},
+    "wifi": {"wifi"},
+    "restaurant": {"restaurant"},
+    "breakfast": {"breakfast"},
+    "fine dining": {"restaurant", "dining", "gastronomy", "michelin"},
+    "wine": {"wine", "winery", "wineries", "enoteca", "bar"},
+    "museum": {"museum", "museums", "heritage", "art_gallery"},
+    "history": {"heritage", "historical", "museum", "etruscan", "medieval"},
+    "nightlife": {"bar", "night_club"},
+    "nature": {"park", "natural_feature"},
+    "shopping": {"shopping_mall", "store", "shopping"},
+    "tours": {"tours", "travel_agency", "tour"},
+    "cooking": {"cooking", "gastronomy"},
+    "relax": {"spa", "wellness", "relaxation"},
+}
+
+# liteapi (Booking-derived) facility ids -> the amenity token they stand for.
+# Breakfast is a rate board type there, not a hotel facility, so it has no id.
+FACILITY_TOKENS = {
+    2: "parking",
+    3: "restaurant",
+    11: "gym",
+    46: "parking",
+    54: "spa",
+    96: "wifi",
+    103: "pool",
+    104: "pool",
+    107: "wifi",
+    301: "pool",
+    433: "pool",
+}
+
+# Full-scale rating per item ``source``; unknown sources are guessed per item.
+RATING_SCALES = {"liteapi": 10.0, "duffel": 10.0, "google_maps": 5.0}
+
+# Bumped when FeatureTable.build changes, so cached tables are rebuilt.
+FEATURE_VERSION = 2
+
+_WORD = re.compile(r"[a-z][a-z0-9_]+")
+# Words dropped from a must-have before it is turned into a token.
+FILLER_WORDS = frozenset({
+    "a", "an", "the", "some", "any", "access", "to", "on", "site", "onsite", "free", "good", "nice",
+    "decent", "proper", "really", "definitely", "also", "please", "with",
+})
+_MUST = re.compile(r"\b(?:must[- ]haves?|need|requires?)\b:?\s*(.+)")
+_NEGATED = re.compile(r"\b(?:don't|dont|do not|doesn't|does not|won't|will not|not|never|no)\s+(?:really\s+)?$")
+# Separates must-haves that are all required; "x or y" stays one phrase and either satisfies it.
+_MUST_SPLIT = re.compile(r",|;|/|&|\b(?:and|plus|as well as)\b")
+
+
+def item_tokens(item: dict) -> set[str]:
+    tokens = {str(t).lower() for t in item.get("types") or ()}
+    tokens |= {str(a).lower().replace(" ", "_") for a in item.get("amenities") or ()}
+    for facility in item.get("facility_ids") or ():
+        tokens.add(f"facility:{facility}")
+        if facility in FACILITY_TOKENS:
+            tokens.add(FACILITY_TOKENS[facility])
+    tokens |= {w for w in _WORD.findall(str(item.get("category") or "").lower()) if len(w) >= 4}
+    return tokens
+
+
+def rating_scale(item: dict) -> float:
+    scale = RATING_SCALES.get(str(item.get("source") or "").lower())
+    if scale is None:
+        scale = 10.0 if (item.get("rating") or 0) > 5.0 else 5.0
+    return scale
+
+
+def masterlist_digest(items: list[dict], venue: tuple[float, float] | None = None) -> str:
+    payload = {"items": items, "venue": list(venue) if venue else None, "version": FEATURE_VERSION}
+    text = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def _popcount(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a uint64 matrix."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return np.unpackbits(words.view(np.uint8), axis=1).sum(axis=1, dtype=np.int64)
+
+
+@dataclass
+class Preferences:
+    min_stars: int = 0
+    preferred_stars: int = 0
+    required: list[set[str]] = field(default_factory=list)  # every group must match one token
+    interests: set[str] = field(default_factory=set)
+    budget: str = "mid"  # "low" | "mid" | "high"
+    prefers_close: bool = False
+
+    def weights(self) -> np.ndarray:
+        """Weight per column of ``FEATURES``."""
+        price = {"low": -1.0, "mid": 0.0, "high": 0.5}[self.budget]
+        return np.array([
+            3.0,                                  # rating
+            1.0,                                  # popularity
+            1.0 if self.preferred_stars or self.min_stars else 0.5,
+            price,
+            2.5 if self.prefers_close else 1.0,   # proximity
+        ], dtype=np.float32)
+
+
+def _requirement(phrase: str) -> set[str]:
+    """Tokens satisfying one must-have phrase, e.g. "a heated pool" -> the pool synonyms
+    and "a pool or a spa" -> pool and spa synonyms.
+
+    Known keywords are looked up as whole words anywhere in the phrase;
+    otherwise the phrase minus articles and filler becomes a single token
+    (which ``FeatureTable.unmatched`` reports when no item carries it).
+    """
+    tokens: set[str] = set()
+    for keyword, synonyms in TOKEN_SYNONYMS.items():
+        if re.search(rf"\b{re.escape(keyword)}s?\b", phrase):
+            tokens |= synonyms
+    if tokens:
+        return tokens
+    words = [w for w in re.findall(r"[a-z0-9]+", phrase) if w not in FILLER_WORDS]
+    return {"_".join(words)} if words else set()
+
+
+def parse_preferences(markdown: str) -> Preferences:
+    """Extract ranking signals from the ``users.preferences`` markdown."""
+    prefs = Preferences()
+    text = (markdown or "").lower().replace("\u2019", "'")
+
+    for line in text.splitlines():
+        stars = re.search(r"(\d)\s*-?\s*stars?", line)
+        if stars:
+            if re.search(r"minimum|at least|min\.?\s|or (better|above|more)", line):
+                prefs.min_stars = max(prefs.min_stars, int(stars.group(1)))
+            else:
+                prefs.preferred_stars = int(stars.group(1))
+        must = _MUST.search(line)
+        if must and not _NEGATED.search(line[:must.start()]):
+            for phrase in _MUST_SPLIT.split(must.group(1)):
+                if re.match(r"\s*(?:not|no|without)\b", phrase):
+                    continue
+                group = _requirement(phrase)
+                if group:
+                    prefs.required.append(group)
+
+    for keyword, tokens in TOKEN_SYNONYMS.items():
+        if re.search(rf"\b{re.escape(keyword)}s?\b", text):
+            prefs.interests |= tokens
+    interests = re.search(r"#+\s*interests?\s*\n(.*?)(?:\n#|\Z)", text, re.S)
+    if interests:
+        for word in _WORD.findall(interests.group(1)):
+            if len(word) >= 4:
+                prefs.interests.add(word)
+
+    if re.search(r"budget[- ]conscious|cheap|affordable|low budget|value for money", text):
+        prefs.budget = "low"
+    elif re.search(r"luxury|quality over cost|upscale|flexible|no budget", text):
+        prefs.budget = "high"
+    prefs.prefers_close = bool(re.search(r"central|close to|near(by)? the venue|walking distance", text))
+    return prefs
+
+
+class FeatureTable:
+    """Precomputed, normalized feature columns and token bitsets for one masterlist."""
+
+    def __init__(self, ids: np.ndarray, features: np.ndarray, stars: np.ndarray, distance_km: np.ndarray,
+                 vocab: np.ndarray, bits: np.ndarray, digest: str):
+        self.ids = ids
+        self.features = features
+        self.stars = stars
+        self.distance_km = distance_km
+        self.vocab = vocab
+        self.bits = bits
+        self.digest = digest
+        self._token_index = {t: i for i, t in enumerate(vocab.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, items: list[dict], venue: tuple[float, float] | None = None) -> FeatureTable:
+        n = len(items)
+
+        def column(key: str) -> np.ndarray:
+            return np.array([np.nan if item.get(key) is None else float(item[key]) for item in items], dtype=np.float64)
+
+        rating = column("rating")
+        scale = np.array([rating_scale(item) for item in items], dtype=np.float64)
+        rating_norm = np.nan_to_num(rating / scale, nan=0.0)
+        count = np.nan_to_num(column("rating_count"), nan=0.0)
+        popularity = np.log1p(count) / max(np.log1p(count).max(initial=0.0), 1.0)
+        stars = np.nan_to_num(column("stars"), nan=0.0)
+        price = column("price_level")
+        price_norm = np.nan_to_num(price / 4.0, nan=0.5)
+
+        lat, lon = column("latitude"), column("longitude")
+        if venue is not None:
+            distance = haversine_km(venue[0], venue[1], lat, lon)
+            finite = distance[np.isfinite(distance)]
+            far = finite.max(initial=1.0) or 1.0
+            proximity = np.nan_to_num(1.0 - distance / far, nan=0.0)
+        else:
+            distance = np.full(n, np.nan)
+            proximity = np.zeros(n)
+
+        features = np.column_stack([rating_norm, popularity, stars / 5.0, price_norm, proximity]).astype(np.float32)
+
+        token_sets = [item_tokens(item) for item in items]
+        vocab = np.array(sorted(set().union(*token_sets)) if token_sets else [], dtype=str)
+        index = {t: i for i, t in enumerate(vocab.tolist())}
+        words = max(1, (len(vocab) + 63) // 64)
+        bits = np.zeros((n, words), dtype=np.uint64)
+        for row, tokens in enumerate(token_sets):
+            for token in tokens:
+                pos = index[token]
+                bits[row, pos // 64] |= np.uint64(1) << np.uint64(pos % 64)
+
+        ids = np.array([str(item.get("id")) for item in items], dtype=str)
+        return cls(ids, features, stars.astype(np.int16), distance, vocab, bits, masterlist_digest(items, venue))
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as fh:
+            np.savez_compressed(fh, ids=self.ids, features=self.features, stars=self.stars,
+                                distance_km=self.distance_km, vocab=self.vocab, bits=self.bits,
+                                digest=np.array(self.digest))
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> FeatureTable:
+        with np.load(path, allow_pickle=False) as d:
+            return cls(d["ids"], d["features"], d["stars"], d["distance_km"], d["vocab"], d["bits"], str(d["digest"]))
+
+    @classmethod
+    def cached(cls, items: list[dict], path: str | Path, venue: tuple[float, float] | None = None) -> FeatureTable:
+        """Load the table at ``path`` if it was built from the same masterlist and venue, else rebuild it."""
+        path = Path(path)
+        digest = masterlist_digest(items, venue)
+        if path.exists():
+            table = cls.load(path)
+            if table.digest == digest:
+                return table
+        table = cls.build(items, venue)
+        table.save(path)
+        return table
+
+    def mask_for(self, tokens: Iterable[str]) -> np.ndarray:
+        """uint64 word mask with the bits of the known ``tokens`` set."""
+        mask = np.zeros(self.bits.shape[1], dtype=np.uint64)
+        for token in tokens:
+            pos = self._token_index.get(token)
+            if pos is not None:
+                mask[pos // 64] |= np.uint64(1) << np.uint64(pos % 64)
+        return mask
+
+    def unmatched(self, prefs: Preferences) -> list[list[str]]:
+        """Must-have groups no row carries; ``eligible`` ignores them."""
+        return [sorted(group) for group in prefs.required if not self.mask_for(group).any()]
+
+    def eligible(self, prefs: Preferences) -> np.ndarray:
+        """Hard filters. Star floors and must-haves that no row of this table
+        carries (e.g. stars on activities, "breakfast" on liteapi hotels) are
+        skipped rather than emptying the result; see ``unmatched``."""
+        keep = np.ones(len(self), dtype=bool)
+        if prefs.min_stars and self.stars.any():
+            keep &= self.stars >= prefs.min_stars
+        for group in prefs.required:
+            mask = self.mask_for(group)
+            if mask.any():
+                keep &= np.any(self.bits & mask, axis=1)
+        return keep
+
+    def interest_score(self, prefs: Preferences) -> np.ndarray:
+        mask = self.mask_for(prefs.interests)
+        wanted = int(_popcount(mask[None, :])[0])
+        if not wanted:
+            return np.zeros(len(self), dtype=np.float32)
+        return (_popcount(self.bits & mask) / min(wanted, 3)).clip(0, 1).astype(np.float32)
+
+    def score(self, prefs: Preferences) -> np.ndarray:
+        """Score every row for one user; ineligible rows get ``-inf``."""
+        scores = self.features @ prefs.weights() + 2.0 * self.interest_score(prefs)
+        if prefs.preferred_stars:
+            scores -= 0.3 * np.abs(self.stars - prefs.preferred_stars)
+        return np.where(self.eligible(prefs), scores, -np.inf)
+
+    def score_many(self, prefs_list: list[Preferences]) -> np.ndarray:
+        """``(users, items)`` scores; the numeric part is a single matrix product."""
+        weights = np.stack([p.weights() for p in prefs_list])
+        scores = weights @ self.features.T
+        for u, prefs in enumerate(prefs_list):
+            scores[u] += 2.0 * self.interest_score(prefs)
+            if prefs.preferred_stars:
+                scores[u] -= 0.3 * np.abs(self.stars - prefs.preferred_stars)
+            scores[u] = np.where(self.eligible(prefs), scores[u], -np.inf)
+        return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> list[tuple[int, float]]:
+    """Best ``k`` finite scores as ``(row, score)``, highest first; ties keep row order."""
+    rows = np.flatnonzero(np.isfinite(scores))
+    best = heapq.nlargest(k, zip(scores[rows].tolist(), (-rows).tolist()))
+    return [(-neg_row, score) for score, neg_row in best]
@@ -0,0 +1,92 @@
+"""Token-bucket rate limiting and jittered retries for supplier API calls."""
+
+from __future__ import annotations
+
+import hashlib
+import random
+import threading
+import time
+from typing import Callable, TypeVar
+
+import requests
+
+from shared.api_client import ApiError
+from shared.instrumentation import recorder
+
+T = TypeVar("T")
+
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until ``tokens`` are available; return the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+_buckets: dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(api_key: str, rate: float) -> TokenBucket:
+    """Process-wide bucket per API key, so every caller shares the key's QPS budget."""
+    name = hashlib.sha256(api_key.encode()).hexdigest()
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            bucket = _buckets[name] = TokenBucket(rate)
+        return bucket
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, ApiError):
+        return error.status in RETRYABLE_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def retry_with_backoff(
+    fn: Callable[[], T],
+    attempts: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 20.0,
+    on_retry: Callable[[int, Exception, float], None] | None = None,
+) -> T:
+    """Call ``fn`` until it succeeds, sleeping with full-jitter exponential backoff.
+
+    Only errors accepted by ``is_retryable`` are retried; the last error is
+    re-raised once ``attempts`` is exhausted.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except Exception as error:
+            if attempt == attempts or not is_retryable(error):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            recorder.retry(error)
+            if on_retry is not None:
+                on_retry(attempt, error, delay)
+            time.sleep(delay)
+    raise AssertionError("unreachable")
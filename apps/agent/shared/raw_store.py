@@ -0,0 +1,251 @@
+"""Append-only JSONL storage for raw supplier results.
+
+Skill scripts append each page of results to a ``.jsonl`` (or
+``.jsonl.gz``) file as it arrives; the compile step streams the file back
+with generators. The first line of a file is a ``{"_meta": {...}}`` header;
+every other line is one item in compact JSON (``facility_ids`` sorted,
+which also helps gzip).
+
+Gzip files are written as one gzip member per page, so appending never
+rewrites earlier data and a reader can resume from the byte offset where
+it last stopped. Legacy single-document ``.json`` dumps are still readable.
+
+Usage:
+    python -m shared.raw_store convert files/content/accommodations/lajatico_raw_hotels.json --gzip
+    python -m shared.raw_store count files/content/accommodations/
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator
+
+RAW_SUFFIXES = (".jsonl", ".jsonl.gz", ".json")
+# Keys under which legacy single-document dumps keep their item arrays.
+LEGACY_ITEM_KEYS = ("hotels", "places", "items", "results")
+
+
+def is_raw_file(path: Path) -> bool:
+    return path.is_file() and path.name.endswith(RAW_SUFFIXES) and not path.name.startswith(".")
+
+
+def _compact(item: dict) -> dict:
+    if isinstance(item.get("facility_ids"), list):
+        item = dict(item, facility_ids=sorted(item["facility_ids"]))
+    return item
+
+
+def _encode(record: dict) -> bytes:
+    return (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode()
+
+
+class RawWriter:
+    """Append pages of items to a raw JSONL file, flushing after every page.
+
+    ``fresh=True`` starts a new file for this run, replacing any earlier
+    one (re-running a search must not duplicate its items). Pages then go
+    to a hidden temp file next to it, which ``commit()`` swaps in with
+    ``os.replace`` once the run succeeded; until then the previous run's
+    file stays in place, and ``discard()`` drops a failed run's pages. Used
+    as a context manager, the writer commits on success and discards on an
+    exception.
+    """
+
+    def __init__(self, path: str | Path, meta: dict | None = None, fresh: bool = False):
+        self.path = Path(path)
+        self.compressed = self.path.name.endswith(".gz")
+        self.items_written = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._staged: Path | None = None
+        if fresh or not self.path.exists() or self.path.stat().st_size == 0:
+            header = _encode({"_meta": {"created_at": datetime.now().isoformat(), **(meta or {})}})
+            tmp = self.path.with_name(f".{self.path.name}.tmp")
+            self._append(header, tmp, mode="wb")
+            if fresh:
+                self._staged = tmp
+            else:
+                os.replace(tmp, self.path)
+
+    def __enter__(self) -> RawWriter:
+        return self
+
+    def __exit__(self, exc_type, *exc) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+    def commit(self) -> None:
+        """Make a fresh run's pages the file's contents (no-op when appending in place)."""
+        if self._staged is not None:
+            os.replace(self._staged, self.path)
+            self._staged = None
+
+    def discard(self) -> None:
+        """Drop a fresh run's pages and keep the previous file."""
+        if self._staged is not None:
+            self._staged.unlink(missing_ok=True)
+            self._staged = None
+
+    def _append(self, data: bytes, path: Path | None = None, mode: str = "ab") -> None:
+        if self.compressed:
+            data = gzip.compress(data)
+        with open(path or self._staged or self.path, mode) as fh:
+            fh.write(data)
+            fh.flush()
+
+    def append_page(self, items: Iterable[dict]) -> int:
+        data = b"".join(_encode(_compact(item)) for item in items)
+        if not data:
+            return 0
+        self._append(data)
+        count = data.count(b"\n")
+        self.items_written += count
+        return count
+
+
+class _Window(io.RawIOBase):
+    """Read-only view of ``fh`` that stops at byte ``end``."""
+
+    def __init__(self, fh, end: int | None):
+        self._fh = fh
+        self._end = end
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = len(buffer)
+        if self._end is not None:
+            size = min(size, self._end - self._fh.tell())
+        if size <= 0:
+            return 0
+        data = self._fh.read(size)
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _iter_lines(path: Path, offset: int, end: int | None = None) -> Iterator[bytes]:
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        window = io.BufferedReader(_Window(fh, end))
+        stream = gzip.GzipFile(fileobj=window) if path.name.endswith(".gz") else window
+        for line in stream:
+            # A line without its newline is a page still being written; stop before it.
+            if not line.endswith(b"\n"):
+                return
+            if line.strip():
+                yield line
+
+
+def committed_size(path: str | Path) -> int:
+    """Byte length of the fully written prefix of a raw JSONL file.
+
+    Plain files may end in a half-written line while a writer is mid-page;
+    that tail is excluded. Each gzip page is a single ``write()`` of a
+    complete member, so the file size is used as-is.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    if path.name.endswith(".gz") or size == 0:
+        return size
+    with open(path, "rb") as fh:
+        pos = size
+        while pos > 0:
+            step = min(65536, pos)
+            fh.seek(pos - step)
+            chunk = fh.read(step)
+            newline = chunk.rfind(b"\n")
+            if newline != -1:
+                return pos - step + newline + 1
+            pos -= step
+    return 0
+
+
+def read_meta(path: str | Path) -> dict:
+    path = Path(path)
+    if path.name.endswith(".json"):
+        data = json.loads(path.read_text())
+        return {k: v for k, v in data.items() if k not in LEGACY_ITEM_KEYS} if isinstance(data, dict) else {}
+    for line in _iter_lines(path, 0):
+        record = json.loads(line)
+        return record.get("_meta", {})
+    return {}
+
+
+def iter_items(path: str | Path, offset: int = 0, end: int | None = None) -> Iterator[dict]:
+    """Yield the items of a raw file between byte ``offset`` and ``end``.
+
+    Offsets are only meaningful for JSONL files (gzip offsets must fall on
+    a member boundary, which a previously observed file size always does);
+    legacy ``.json`` documents are parsed whole.
+    """
+    path = Path(path)
+    if path.name.endswith(".json"):
+        data = json.loads(path.read_text())
+        if isinstance(data, list):
+            yield from data
+            return
+        for key in LEGACY_ITEM_KEYS:
+            if isinstance(data.get(key), list):
+                yield from data[key]
+                return
+        return
+    for line in _iter_lines(path, offset, end):
+        record = json.loads(line)
+        if "_meta" not in record:
+            yield record
+
+
+def iter_raw_files(directory: str | Path) -> Iterator[Path]:
+    directory = Path(directory)
+    if directory.is_dir():
+        yield from sorted(p for p in directory.iterdir() if is_raw_file(p))
+
+
+def convert(path: Path, compress: bool = False) -> Path:
+    """Rewrite a legacy ``.json`` dump as JSONL next to it."""
+    target = path.with_name(path.name[: -len(".json")] + (".jsonl.gz" if compress else ".jsonl"))
+    if target.exists():
+        raise FileExistsError(target)
+    writer = RawWriter(target, meta=read_meta(path))
+    page: list[dict] = []
+    for item in iter_items(path):
+        page.append(item)
+        if len(page) == 100:
+            writer.append_page(page)
+            page = []
+    writer.append_page(page)
+    return target
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Convert or count raw supplier result files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert_cmd = sub.add_parser("convert", help="Rewrite a legacy .json dump as JSONL")
+    convert_cmd.add_argument("paths", nargs="+", type=Path)
+    convert_cmd.add_argument("--gzip", action="store_true")
+    count_cmd = sub.add_parser("count", help="Count raw files and items under directories")
+    count_cmd.add_argument("directories", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        for path in args.paths:
+            target = convert(path, compress=args.gzip)
+            print(json.dumps({"source": str(path), "target": str(target), "bytes": target.stat().st_size}))
+    else:
+        files = [p for d in args.directories for p in iter_raw_files(d)]
+        items = sum(sum(1 for _ in iter_items(p)) for p in files)
+        print(json.dumps({"raw_file_count": len(files), "raw_item_count": items}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,389 @@
+"""Offline end-to-end replay of the inventory, planning and revision pipelines.
+
+Starts the stub servers in ``shared/replay_stubs.py`` over the recorded
+Lajatico fixtures, points every client at them (no network), and runs:
+
+- inventory: stays search -> raw JSONL -> compile -> filter, activity
+  searches, masterlist delta sync (twice; the second must be a no-op)
+- planning: travel matrix, preference ranking for ``--users`` users,
+  plan rows written to ``user_plans``
+- revision: one activity swap per plan, incremental patch, write-back
+
+Every stage is a ``shared.instrumentation`` span, so the report has wall
+time, throughput, API calls, bytes, retries and latency percentiles per
+stage; the same summary is appended to a run in the replay's run log.
+``--baseline`` compares against a saved report and exits 1 on
+regressions.
+
+Usage:
+    python -m shared.replay
+    python -m shared.replay --users 200 --latency-ms 20 --save-baseline replay_baseline.json
+    python -m shared.replay --baseline replay_baseline.json --tolerance 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+from types import ModuleType
+
+from shared.api_client import pooled_session
+from shared.duffel_client import DuffelClient
+from shared.instrumentation import recorder, span
+from shared.maps_client import MapsClient
+from shared.ranking import FeatureTable, parse_preferences, top_k
+from shared.ratelimit import retry_with_backoff
+from shared.raw_store import RawWriter
+from shared.replay_stubs import Fixtures, ReplayServer, StubState
+from shared.run_log import COMPLETED, RunLog, subject_key
+from shared.supabase_rest import SupabaseRest
+from shared.travel_matrix import TravelMatrix, points_from_masterlists
+
+AGENT_DIR = Path(__file__).resolve().parents[1]
+INVENTORY_DIR = AGENT_DIR / "inventory"
+HOTELS_FIXTURE = INVENTORY_DIR / "files/content/accommodations/lajatico_raw_hotels.json"
+ACCOMMODATION_FIXTURE = INVENTORY_DIR / "files/context/accommodation.json"
+ACTIVITIES_FIXTURE = INVENTORY_DIR / "files/context/activities.json"
+OCCASION_FIXTURE = INVENTORY_DIR / "files/process/occasion_context.json"
+
+PIPELINES = ("inventory", "planning", "revision")
+PAGE_SIZE = 50
+# Rotated across replay users so ranking sees different weights and filters.
+PREFERENCES = (
+    "### Accommodation\n- Minimum 4-star hotels\n- Must have pool\n### Interests\n- Fine dining\n- Wine\n"
+    "### Budget\n- Flexible, quality over cost",
+    "### Accommodation\n- 3-star is fine\n### Interests\n- Museums and history\n### Budget\n- Budget-conscious",
+    "### Accommodation\n- Close to the venue\n### Interests\n- Nature, tours and cooking classes",
+    "### Interests\n- Nightlife\n- Shopping\n### Budget\n- Value for money",
+)
+# Regressions smaller than these are noise, whatever the relative change.
+MIN_SECONDS_DELTA = 0.05
+MIN_LATENCY_DELTA_MS = 5.0
+
+
+def _load_script(agent: str, skill: str, name: str) -> ModuleType:
+    """Import a skill script (their directories are not packages)."""
+    path = AGENT_DIR / agent / ".claude" / "skills" / skill / "scripts" / f"{name}.py"
+    if str(path.parent) not in sys.path:
+        sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(f"replay_{agent}_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module  # dataclasses look their module up while executing
+    spec.loader.exec_module(module)
+    return module
+
+
+class Replay:
+    def __init__(self, workdir: Path, users: int, revisions: int):
+        self.workdir = workdir
+        self.files = workdir / "files"
+        self.users = users
+        self.revisions = revisions
+        self.occasion = json.loads(OCCASION_FIXTURE.read_text())
+        self.accommodation_context = json.loads(ACCOMMODATION_FIXTURE.read_text())
+        self.activities_context = json.loads(ACTIVITIES_FIXTURE.read_text())
+        location = self.accommodation_context["search_location"]
+        self.venue = (location["latitude"], location["longitude"])
+        self.radius_km = location.get("radius_km", 25)
+        self.matrix: TravelMatrix | None = None
+
+    def inventory(self) -> None:
+        compile_raw = _load_script("inventory", "orchestrating-workflow", "compile_raw")
+        masterlist_sync = _load_script("inventory", "orchestrating-workflow", "masterlist_sync")
+        filter_hotels = _load_script("inventory", "duffel", "filter_hotels")
+        search_places = _load_script("inventory", "google-maps", "search_places")
+        compiler = compile_raw.RawCompiler(self.files / "process" / "compiled.sqlite3")
+        supabase = SupabaseRest()
+        supabase.upsert("occasions", [dict(self.occasion)], on_conflict="id")
+
+        try:
+            with span("inventory.accommodation.search") as attrs:
+                client = DuffelClient(session=pooled_session(4))
+                start = date.fromisoformat(self.occasion["start_date"])
+                response = retry_with_backoff(lambda: client.search_stays(
+                    *self.venue, self.radius_km, str(start - timedelta(days=1)), str(start + timedelta(days=1))
+                ))
+                hotels = [r["accommodation"] for r in response["data"]["results"]]
+                with RawWriter(
+                    self.files / "content/accommodations/duffel_stays.jsonl", meta={"source": "duffel"}, fresh=True
+                ) as writer:
+                    for i in range(0, len(hotels), PAGE_SIZE):
+                        writer.append_page(hotels[i:i + PAGE_SIZE])
+                attrs["items"] = len(hotels)
+
+            with span("inventory.accommodation.compile") as attrs:
+                kind, directory = compile_raw.STEP_SOURCES["accommodation"]
+                attrs["items"] = compiler.compile_dir(kind, self.files / directory)["unique_item_count"]
+
+            with span("inventory.accommodation.filter") as attrs:
+                table = filter_hotels.HotelTable(list(compiler.iter_compiled("accommodations")))
+                query = filter_hotels.FilterQuery.from_context(self.accommodation_context)
+                idx, dist = filter_hotels.filter_hotels(table, query)
+                selected = [dict(table.items[i], distance_km=round(float(d), 2)) for i, d in zip(idx, dist)]
+                attrs["items"] = len(table)
+                attrs["selected"] = len(selected)
+
+            with span("inventory.activities.search") as attrs:
+                tasks = search_places.load_tasks(self.activities_context)
+                result = search_places.run_searches(
+                    MapsClient(session=pooled_session(8)), tasks, *self.venue, int(self.radius_km * 1000),
+                    self.files / "content/activities", workers=8,
+                )
+                attrs["items"] = result["places"]
+                attrs["queries"] = result["queries"]
+
+            with span("inventory.activities.compile") as attrs:
+                kind, directory = compile_raw.STEP_SOURCES["activities"]
+                attrs["items"] = compiler.compile_dir(kind, self.files / directory)["unique_item_count"]
+
+            sources = {
+                "accommodations": lambda: iter(selected),
+                "activities": lambda: compiler.iter_compiled("activities"),
+            }
+            for name in ("inventory.masterlist.sync", "inventory.masterlist.resync"):
+                with span(name) as attrs:
+                    sync = masterlist_sync.MasterlistSync(supabase, self.occasion["id"])
+                    results = [sync.sync(field, source) for field, source in sources.items()]
+                    attrs["items"] = sum(r["added"] + r["changed"] + r["unchanged"] for r in results)
+                    attrs["written"] = sum(r["added"] + r["changed"] + r["removed"] for r in results)
+        finally:
+            compiler.close()
+
+    def _occasion_lists(self) -> tuple[list[dict], list[dict]]:
+        rows = list(SupabaseRest().select("occasions", {"id": f"eq.{self.occasion['id']}"}))
+        return rows[0].get("accommodations") or [], rows[0].get("activities") or []
+
+    def planning(self) -> None:
+        accommodations, activities = self._occasion_lists()
+        supabase = SupabaseRest()
+
+        with span("planning.travel_matrix") as attrs:
+            points = points_from_masterlists(accommodations, activities)
+            self.matrix = TravelMatrix.build(points, client=MapsClient(session=pooled_session(4)), workers=4)
+            attrs["items"] = int(self.matrix.seconds.size)
+
+        with span("planning.ranking") as attrs:
+            users = [
+                {"id": f"replay-user-{n:05d}", "preferences": PREFERENCES[n % len(PREFERENCES)]}
+                for n in range(self.users)
+            ]
+            prefs = [parse_preferences(u["preferences"]) for u in users]
+            hotel_table = FeatureTable.build(accommodations, self.venue)
+            activity_table = FeatureTable.build(activities, self.venue)
+            hotel_scores = hotel_table.score_many(prefs)
+            activity_scores = activity_table.score_many(prefs)
+            picks = [
+                ([accommodations[i] for i, _ in top_k(hs, 3)], [activities[i] for i, _ in top_k(acs, 8)])
+                for hs, acs in zip(hotel_scores, activity_scores)
+            ]
+            attrs["items"] = len(users)
+
+        with span("planning.plan") as attrs:
+            start = date.fromisoformat(self.occasion["start_date"]) - timedelta(days=1)
+            end = date.fromisoformat(self.occasion["end_date"]) + timedelta(days=1)
+            day_dates = [str(start + timedelta(days=k)) for k in range((end - start).days + 1)]
+            rows = []
+            for user, (hotels, chosen) in zip(users, picks):
+                rows.append({
+                    "id": f"replay-plan-{user['id'][-5:]}",
+                    "occasion_id": self.occasion["id"],
+                    "user_id": user["id"],
+                    "transportation": {},
+                    "accommodation": hotels,
+                    "activities": chosen,
+                    "plan": self._schedule(day_dates, hotels, chosen),
+                    "change_log": [],
+                })
+            for i in range(0, len(rows), 200):
+                supabase.upsert("user_plans", rows[i:i + 200], on_conflict="id")
+            attrs["items"] = len(rows)
+
+    def _schedule(self, day_dates: list[str], hotels: list[dict], chosen: list[dict]) -> dict:
+        days, queue = [], list(chosen)
+        for n, day in enumerate(day_dates):
+            items = []
+            if hotels:
+                title = ("Check-in " if n == 0 else "Breakfast at ") + hotels[0]["name"]
+                items.append({"time": "15:00" if n == 0 else "08:30", "type": "accommodation",
+                              "title": title, "ref": str(hotels[0]["id"])})
+            for slot in (("19:30",) if n == 0 else ("11:00", "16:00", "20:00")):
+                if not queue:
+                    break
+                place = queue.pop(0)
+                items.append({"time": slot, "type": "activity", "title": place.get("name"), "ref": str(place["id"])})
+            days.append({"date": day, "day_label": f"Day {n + 1}", "items": items})
+        return {"days": days, "summary": {"total_days": len(days), "activities": len(chosen) - len(queue)}}
+
+    def revision(self) -> None:
+        revise_plan = _load_script("revision", "orchestrating-workflow", "revise_plan")
+        supabase = SupabaseRest()
+        _, activities = self._occasion_lists()
+        plans = list(supabase.select("user_plans", {"occasion_id": f"eq.{self.occasion['id']}"}, order="id"))
+        plans = plans[: self.revisions]
+
+        with span("revision.revise") as attrs:
+            updates = []
+            for plan_row in plans:
+                current = plan_row["activities"]
+                used = {a["id"] for a in current}
+                spare = next((a for a in activities if a["id"] not in used), None)
+                if not current or spare is None:
+                    continue
+                revised = {"activities": [spare] + current[1:]}
+                plan, entry = revise_plan.PlanReviser(plan_row, revised, self.matrix).revise(["different activity"])
+                updates.append((plan_row, revised, plan, entry))
+            attrs["items"] = len(updates)
+            attrs["patch_ops"] = sum(len(e["patch"]) for *_, e in updates)
+
+        with span("revision.write") as attrs:
+            for plan_row, revised, plan, entry in updates:
+                supabase.update(
+                    "user_plans",
+                    {"id": f"eq.{plan_row['id']}"},
+                    {**revised, "plan": plan, "change_log": (plan_row.get("change_log") or []) + [entry]},
+                )
+            attrs["items"] = len(updates)
+            attrs["change_log_bytes"] = sum(len(json.dumps(e)) for *_, e in updates)
+
+
+def build_report(summary: dict) -> dict:
+    """Per-stage wall time, throughput and API figures from a recorder summary."""
+    stages = {}
+    for name, step in summary["steps"].items():
+        calls = summary["api"].get(name, {})
+        hist = [c["latency"] for c in calls.values()]
+        count = sum(h["count"] for h in hist)
+        items = step["attrs"].get("items", 0)
+        stages[name] = {
+            "seconds": step["seconds"],
+            "items": items,
+            "items_per_second": round(items / step["seconds"], 1) if step["seconds"] else None,
+            "api_calls": count,
+            "cache_hits": sum(c["cache_hits"] for c in calls.values()),
+            "retries": sum(c["retries"] for c in calls.values()),
+            "errors": sum(c["errors"] for c in calls.values()),
+            "bytes_in": sum(c["bytes_in"] for c in calls.values()),
+            "bytes_out": sum(c["bytes_out"] for c in calls.values()),
+            "p50_ms": max((h["p50_ms"] for h in hist), default=0.0),
+            "p95_ms": max((h["p95_ms"] for h in hist), default=0.0),
+            **{k: v for k, v in step["attrs"].items() if k != "items"},
+        }
+    return stages
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Stages slower, chattier or higher-latency than the baseline beyond ``tolerance``."""
+    regressions = []
+    for name, base in baseline.get("stages", {}).items():
+        current = report["stages"].get(name)
+        if current is None:
+            regressions.append({"stage": name, "metric": "missing"})
+            continue
+        if current["seconds"] > base["seconds"] * (1 + tolerance) and current["seconds"] - base["seconds"] > MIN_SECONDS_DELTA:
+            regressions.append({"stage": name, "metric": "seconds", "baseline": base["seconds"], "current": current["seconds"]})
+        if current["api_calls"] > base["api_calls"]:
+            regressions.append({"stage": name, "metric": "api_calls", "baseline": base["api_calls"], "current": current["api_calls"]})
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) and current["p95_ms"] - base["p95_ms"] > MIN_LATENCY_DELTA_MS:
+            regressions.append({"stage": name, "metric": "p95_ms", "baseline": base["p95_ms"], "current": current["p95_ms"]})
+    return regressions
+
+
+def run(
+    workdir: Path,
+    pipelines: tuple[str, ...] = PIPELINES,
+    users: int = 50,
+    revisions: int = 50,
+    latency_ms: float = 2.0,
+    fail_every: int = 0,
+) -> dict:
+    fixtures = Fixtures.load(HOTELS_FIXTURE, ACTIVITIES_FIXTURE, ACCOMMODATION_FIXTURE)
+    state = StubState(fixtures, latency_ms=latency_ms, fail_every=fail_every)
+    recorder.reset()
+    with ReplayServer(state) as server:
+        env = {
+            "GOOGLE_MAPS_API_URL": server.url,
+            "GOOGLE_MAPS_API_KEY": "replay",
+            "DUFFEL_API_URL": server.url,
+            "DUFFEL_API_KEY": "replay",
+            "SUPABASE_URL": server.url,
+            "SUPABASE_KEY": "replay",
+            "AGENT_CACHE_PATH": str(workdir / "cache.sqlite3"),
+        }
+        saved = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+        try:
+            replay = Replay(workdir, users, revisions)
+            with RunLog(workdir / "runs.sqlite3") as log:
+                run_id = log.create_run("replay", subject_key(occasion_id=replay.occasion["id"]), list(pipelines))
+                for name in pipelines:
+                    with span(name):
+                        getattr(replay, name)()
+                    log.append(run_id, COMPLETED, name, {"seconds": round(recorder.steps[name]["seconds"], 4)})
+            recorder.flush(run_id, str(workdir / "runs.sqlite3"))
+        finally:
+            for k, v in saved.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+
+    summary = recorder.summary()
+    return {
+        "pipelines": list(pipelines),
+        "users": users,
+        "latency_ms": latency_ms,
+        "fail_every": fail_every,
+        "stub_requests": state.requests,
+        "stub_failures": state.failures,
+        "run_id": run_id,
+        "run_log": str(workdir / "runs.sqlite3"),
+        "totals": {k: v for k, v in summary["totals"].items() if k != "latency"}
+        | {"p50_ms": summary["totals"]["latency"]["p50_ms"], "p95_ms": summary["totals"]["latency"]["p95_ms"]},
+        "stages": build_report(summary),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay the agent pipelines offline against stub servers")
+    parser.add_argument("--pipeline", action="append", choices=PIPELINES, help="Subset to run (default: all, in order)")
+    parser.add_argument("--users", type=int, default=50, help="Planning requests to replay")
+    parser.add_argument("--revisions", type=int, default=50, help="Plans to revise")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Stub server delay per request")
+    parser.add_argument("--fail-every", type=int, default=0, help="Answer every n-th supplier request with 503")
+    parser.add_argument("--workdir", type=Path, help="Keep replay files here (default: a temp dir, removed)")
+    parser.add_argument("--baseline", type=Path, help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown")
+    parser.add_argument("--save-baseline", type=Path, help="Write this report as the new baseline")
+    args = parser.parse_args()
+
+    pipelines = tuple(p for p in PIPELINES if p in (args.pipeline or PIPELINES))
+    if "revision" in pipelines and "planning" not in pipelines or "planning" in pipelines and "inventory" not in pipelines:
+        parser.error("planning needs inventory and revision needs planning in the same replay")
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="agent-replay-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    try:
+        report = run(workdir, pipelines, args.users, args.revisions, args.latency_ms, args.fail_every)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.tolerance)
+        report["regressions"] = regressions
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2))
+    print(json.dumps({"success": not regressions, **report}, indent=2))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""Local stand-ins for Google Maps, Duffel Stays and Supabase PostgREST.
+
+One threaded HTTP server answers all three APIs from recorded fixtures:
+text searches from the activities context (each ``search_queries`` entry
+returns its category's places), stays searches from the raw hotel dump,
+distance matrices and geocoding from coordinates, and PostgREST
+``select``/upsert/update/delete/``rpc/rebuild_masterlist`` from in-memory
+tables (the rebuild also clears ``occasion_masterlist_state.pending``).
+``latency_ms`` adds a fixed server-side delay per request and
+``fail_every`` turns every n-th supplier request into a 503, so retries
+and latency show up in replay numbers without any network access.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from shared.raw_store import iter_items
+from shared.travel_matrix import estimate
+
+
+@dataclass
+class Fixtures:
+    hotels: list[dict]
+    places_by_query: dict[str, list[dict]]
+    venue: tuple[float, float]
+
+    @classmethod
+    def load(cls, hotels_path: Path, activities_path: Path, accommodation_path: Path) -> Fixtures:
+        activities = json.loads(activities_path.read_text())
+        places_by_query: dict[str, list[dict]] = {}
+        for category in activities.get("categories", []):
+            for query in category.get("search_queries", []):
+                places_by_query[query] = category.get("places", [])
+        location = json.loads(accommodation_path.read_text())["search_location"]
+        return cls(list(iter_items(hotels_path)), places_by_query, (location["latitude"], location["longitude"]))
+
+
+def _google_place(place: dict) -> dict:
+    return {
+        "place_id": place["id"],
+        "name": place.get("name"),
+        "rating": place.get("rating"),
+        "user_ratings_total": place.get("rating_count"),
+        "formatted_address": place.get("address"),
+        "geometry": {"location": {"lat": place.get("latitude"), "lng": place.get("longitude")}},
+        "price_level": place.get("price_level"),
+        "types": place.get("types", []),
+    }
+
+
+def _split_values(text: str) -> list[str]:
+    """Values of a PostgREST ``in.(...)`` list; double-quoted values may contain commas."""
+    values, current, quoted, escaped = [], [], False, False
+    for ch in text:
+        if escaped:
+            current.append(ch)
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch == '"':
+            quoted = not quoted
+        elif ch == "," and not quoted:
+            values.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    values.append("".join(current))
+    return values
+
+
+def _matches(row: dict, filters: dict[str, str]) -> bool:
+    for column, expr in filters.items():
+        value = "" if row.get(column) is None else str(row.get(column))
+        if expr.startswith("eq.") and value != expr[3:]:
+            return False
+        if expr.startswith("in.(") and value not in _split_values(expr[4:-1]):
+            return False
+    return True
+
+
+@dataclass
+class StubState:
+    fixtures: Fixtures
+    latency_ms: float = 0.0
+    fail_every: int = 0
+    tables: dict[str, list[dict]] = field(default_factory=dict)
+    requests: int = 0
+    failures: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this, delayed ACKs add ~40ms per call.
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_PATCH(self) -> None:
+        self._dispatch("PATCH")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+    def _send(self, status: int, payload) -> None:
+        body = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method: str) -> None:
+        state = self.server.state
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+
+        supplier = not url.path.startswith("/rest/v1/")
+        with state.lock:
+            state.requests += 1
+            fail = supplier and state.fail_every and state.requests % state.fail_every == 0
+            state.failures += bool(fail)
+        if state.latency_ms:
+            time.sleep(state.latency_ms / 1000.0)
+        if fail:
+            self._send(503, {"error": "injected failure"})
+            return
+
+        try:
+            if url.path.startswith("/maps/api/"):
+                self._send(200, self._maps(url.path, query))
+            elif url.path == "/stays/search":
+                self._send(200, {"data": {"results": [{"accommodation": h} for h in state.fixtures.hotels]}})
+            elif url.path.startswith("/rest/v1/rpc/"):
+                self._send(200, self._rpc(url.path.rsplit("/", 1)[-1], body or {}))
+            elif url.path.startswith("/rest/v1/"):
+                status, payload = self._table(method, url.path.rsplit("/", 1)[-1], query, body)
+                self._send(status, payload)
+            else:
+                self._send(404, {"error": f"no stub for {url.path}"})
+        except Exception as error:  # surface stub bugs as 500s, not hung connections
+            self._send(500, {"error": str(error)})
+
+    def _maps(self, path: str, query: dict) -> dict:
+        fixtures = self.server.state.fixtures
+        if "textsearch" in path:
+            places = fixtures.places_by_query.get(query.get("query", ""), [])
+            return {"status": "OK" if places else "ZERO_RESULTS", "results": [_google_place(p) for p in places]}
+        if "geocode" in path:
+            lat, lng = fixtures.venue
+            return {"status": "OK", "results": [{"geometry": {"location": {"lat": lat, "lng": lng}}}]}
+        if "distancematrix" in path:
+            def coords(text):
+                return [tuple(map(float, c.split(","))) for c in text.split("|")]
+
+            mode = query.get("mode", "driving")
+            rows = []
+            for olat, olon in coords(query["origins"]):
+                elements = []
+                for dlat, dlon in coords(query["destinations"]):
+                    seconds, meters = estimate(olat, olon, dlat, dlon, mode)
+                    elements.append({"status": "OK", "duration": {"value": int(seconds)}, "distance": {"value": int(meters)}})
+                rows.append({"elements": elements})
+            return {"status": "OK", "rows": rows}
+        return {"status": "INVALID_REQUEST"}
+
+    def _table(self, method: str, name: str, query: dict, body):
+        state = self.server.state
+        filters = {k: v for k, v in query.items() if k not in ("select", "order", "limit", "offset", "on_conflict")}
+        with state.lock:
+            table = state.tables.setdefault(name, [])
+            if method == "GET":
+                rows = [r for r in table if _matches(r, filters)]
+                if query.get("order"):
+                    column = query["order"].split(".")[0]
+                    rows.sort(key=lambda r: str(r.get(column)))
+                offset, limit = int(query.get("offset", 0)), int(query.get("limit", len(rows) or 1))
+                rows = rows[offset:offset + limit]
+                if query.get("select", "*") != "*":
+                    columns = query["select"].split(",")
+                    rows = [{c: r.get(c) for c in columns} for r in rows]
+                return 200, rows
+            if method == "POST":
+                keys = (query.get("on_conflict") or "id").split(",")
+                index = {tuple(str(r.get(k)) for k in keys): r for r in table}
+                for row in body if isinstance(body, list) else [body]:
+                    existing = index.get(tuple(str(row.get(k)) for k in keys))
+                    if existing is not None:
+                        existing.update(row)
+                    else:
+                        table.append(dict(row))
+                        index[tuple(str(row.get(k)) for k in keys)] = table[-1]
+                return 201, None
+            if method == "PATCH":
+                for row in table:
+                    if _matches(row, filters):
+                        row.update(body or {})
+                return 204, None
+            if method == "DELETE":
+                state.tables[name] = [r for r in table if not _matches(r, filters)]
+                return 204, None
+        return 405, {"error": method}
+
+    def _rpc(self, function: str, args: dict):
+        if function != "rebuild_masterlist":
+            raise ValueError(f"unknown rpc {function}")
+        state = self.server.state
+        with state.lock:
+            items = [
+                r["item"]
+                for r in state.tables.get("occasion_masterlist_items", [])
+                if r["occasion_id"] == args["p_occasion_id"] and r["field"] == args["p_field"]
+            ]
+            items.sort(key=lambda item: str(item.get("id")))
+            for row in state.tables.setdefault("occasions", []):
+                if row.get("id") == args["p_occasion_id"]:
+                    row[args["p_field"]] = items
+            for row in state.tables.get("occasion_masterlist_state", []):
+                if row["occasion_id"] == args["p_occasion_id"] and row["field"] == args["p_field"]:
+                    row["pending"] = False
+        return len(items)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, state: StubState):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.state = state
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> ReplayServer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,303 @@
+"""Persistent SQLite cache for supplier API responses.
+
+One database is shared by every agent checkout (inventory, planning and
+revision), so a revision run reuses the Places lookups the planning run
+already paid for. Entries are keyed on a canonical request (base URL, a
+hash of the credentials, method, endpoint, normalized params/body with auth
+stripped), expire after a per-endpoint TTL and are evicted
+least-recently-used once the database grows past ``max_bytes``. Only
+endpoints with a TTL are cached: anything unlisted (payments,
+cancellations, other writes) always goes to the server.
+
+Usage:
+    python -m shared.response_cache --stats
+    python -m shared.response_cache --purge-expired
+    python -m shared.response_cache --clear
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any
+
+DEFAULT_PATH = Path(__file__).resolve().parents[1] / ".cache" / "responses.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# TTL of endpoints matching no prefix in ``ttls``: not cached.
+DEFAULT_TTL = 0
+# Puts between exact size checks; in between, this process's writes are added up.
+SIZE_CHECK_EVERY = 256
+
+# Returned by ``ResponseCache.get`` on a miss; ``None`` is a valid cached body.
+MISS = object()
+
+# Request fields that never take part in the cache key.
+AUTH_FIELDS = frozenset({"key", "api_key", "apikey", "access_token", "authorization"})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    endpoint    TEXT NOT NULL,
+    body        BLOB NOT NULL,
+    size        INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    expires_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at);
+CREATE TABLE IF NOT EXISTS stats (
+    endpoint  TEXT PRIMARY KEY,
+    hits      INTEGER NOT NULL DEFAULT 0,
+    misses    INTEGER NOT NULL DEFAULT 0,
+    stores    INTEGER NOT NULL DEFAULT 0,
+    evictions INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            str(k): _normalize(v)
+            for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))
+            if v is not None and str(k).lower() not in AUTH_FIELDS
+        }
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+
+def credential_scope(*sources: dict | None) -> str:
+    """Short hash of the auth fields in ``sources`` (headers, query params).
+
+    Goes into the cache key in place of the credentials themselves, so e.g.
+    Duffel test and live tokens, which share one base URL, never share
+    cached responses.
+    """
+    secrets = sorted(
+        (str(k).lower(), str(v)) for source in sources for k, v in (source or {}).items() if str(k).lower() in AUTH_FIELDS
+    )
+    if not secrets:
+        return ""
+    return hashlib.sha256(json.dumps(secrets).encode()).hexdigest()[:16]
+
+
+def canonical_request(
+    method: str, endpoint: str, params: dict | None = None, body: Any = None, base_url: str = "", scope: str = ""
+) -> str:
+    """Stable text form of a request: same call to the same server with the same credentials, same string."""
+    return json.dumps(
+        {
+            "base_url": base_url.rstrip("/").lower(),
+            "scope": scope,
+            "method": method.upper(),
+            "endpoint": "/" + endpoint.strip("/"),
+            "params": _normalize(params or {}),
+            "body": _normalize(body),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+def ttl_for(ttls: dict[str, float], endpoint: str, default: float = DEFAULT_TTL) -> float:
+    """TTL of the longest prefix in ``ttls`` that ``endpoint`` starts with."""
+    endpoint = "/" + endpoint.strip("/")
+    matches = [prefix for prefix in ttls if endpoint.startswith(prefix)]
+    return ttls[max(matches, key=len)] if matches else default
+
+
+class ResponseCache:
+    """SQLite-backed response cache with per-endpoint TTLs and LRU eviction.
+
+    ``ttls`` maps endpoint prefixes to lifetimes in seconds; the longest
+    matching prefix wins and unlisted endpoints get ``default_ttl`` (0, not
+    cached). Connections are per-thread and the database runs
+    in WAL mode, so concurrent skill scripts and worker threads can share it.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        ttls: dict[str, float] | None = None,
+        default_ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.path = Path(path or os.environ.get("AGENT_CACHE_PATH") or DEFAULT_PATH)
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._size_lock = threading.Lock()
+        self._approx_bytes: int | None = None
+        self._puts_since_check = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def ttl_for(self, endpoint: str) -> float:
+        return ttl_for(self.ttls, endpoint, self.default_ttl)
+
+    @staticmethod
+    def key_for(
+        method: str, endpoint: str, params: dict | None = None, body: Any = None, base_url: str = "", scope: str = ""
+    ) -> str:
+        return hashlib.sha256(canonical_request(method, endpoint, params, body, base_url, scope).encode()).hexdigest()
+
+    def _bump(self, endpoint: str, column: str, amount: int = 1) -> None:
+        self._conn().execute(
+            f"INSERT INTO stats (endpoint, {column}) VALUES (?, ?) "
+            f"ON CONFLICT(endpoint) DO UPDATE SET {column} = {column} + excluded.{column}",
+            (endpoint, amount),
+        )
+
+    def get(self, key: str, endpoint: str) -> Any:
+        """Return the cached response, or ``MISS`` on a miss or expired entry."""
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT body, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            self._bump(endpoint, "misses")
+            return MISS
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._bump(endpoint, "hits")
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, key: str, endpoint: str, value: Any, ttl: float | None = None) -> None:
+        now = time.time()
+        ttl = self.ttl_for(endpoint) if ttl is None else ttl
+        if ttl <= 0:
+            return
+        body = zlib.compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode())
+        self._conn().execute(
+            "INSERT OR REPLACE INTO responses (key, endpoint, body, size, created_at, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, endpoint, body, len(body), now, now + ttl, now),
+        )
+        self._bump(endpoint, "stores")
+        self._evict(len(body))
+
+    def _size(self) -> int:
+        return self._conn().execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self, added: int) -> None:
+        """Trim to ``max_bytes`` without summing the table on every put.
+
+        The running total only sees this process's writes (replacements
+        count twice), so it is re-synced with an exact ``SUM`` every
+        ``SIZE_CHECK_EVERY`` puts and whenever it crosses the limit.
+        """
+        with self._size_lock:
+            self._puts_since_check += 1
+            if self._approx_bytes is None or self._puts_since_check >= SIZE_CHECK_EVERY:
+                self._approx_bytes, self._puts_since_check = self._size(), 0
+            else:
+                self._approx_bytes += added
+            if self._approx_bytes <= self.max_bytes:
+                return
+            self._approx_bytes, self._puts_since_check = self._trim(), 0
+
+    def _trim(self) -> int:
+        conn = self._conn()
+        total = self._size()
+        if total <= self.max_bytes:
+            return total
+        self.purge_expired()
+        total = self._size()
+        while total > self.max_bytes:
+            victims = conn.execute(
+                "SELECT key, endpoint, size FROM responses ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not victims:
+                break
+            evicted = []
+            for key, endpoint, size in victims:
+                evicted.append((key,))
+                self._bump(endpoint, "evictions")
+                total -= size
+                if total <= self.max_bytes:
+                    break
+            conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        return total
+
+    def purge_expired(self) -> int:
+        cursor = self._conn().execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM responses")
+        conn.execute("DELETE FROM stats")
+        with self._size_lock:
+            self._approx_bytes = None
+
+    def stats(self) -> dict:
+        """Hit/miss counters per endpoint plus current size of the store."""
+        conn = self._conn()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        endpoints = {}
+        for endpoint, hits, misses, stores, evictions in conn.execute(
+            "SELECT endpoint, hits, misses, stores, evictions FROM stats ORDER BY endpoint"
+        ):
+            lookups = hits + misses
+            endpoints[endpoint] = {
+                "hits": hits,
+                "misses": misses,
+                "stores": stores,
+                "evictions": evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+            }
+        return {"path": str(self.path), "entries": entries, "bytes": size, "endpoints": endpoints}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect or maintain the shared API response cache")
+    parser.add_argument("--path", type=Path, help="Cache database (default: $AGENT_CACHE_PATH or apps/agent/.cache)")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--stats", action="store_true")
+    group.add_argument("--purge-expired", action="store_true")
+    group.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.path)
+    if args.purge_expired:
+        print(json.dumps({"purged": cache.purge_expired()}))
+    elif args.clear:
+        cache.clear()
+        print(json.dumps({"cleared": True}))
+    else:
+        print(json.dumps(cache.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""Append-only workflow event log in SQLite (WAL).
+
+Every workflow run (one occasion for inventory, one user plan for
+planning) gets a ``run_id``; state changes are appended as events and never
+rewritten, so any number of worker processes can log to the same database
+without the read-modify-write race of ``execution_state.json``. The
+current state is folded from the events inside one read transaction, which
+WAL serves from a consistent snapshot while writers keep appending.
+
+``snapshot()`` returns the same shape as ``execution_state.json`` and
+``export_json()`` writes it atomically for readers that still expect the
+file.
+
+``claim()`` picks the run a worker should work on for a subject and records
+a ``claimed`` event with a lease, inside one ``BEGIN IMMEDIATE``
+transaction, so two workers (or two batch invocations) never run the same
+subject at once. A claim ends with a ``released`` event; one whose lease
+expired, or whose process is gone on this host, is stale and can be taken
+over.
+
+Usage:
+    python -m shared.run_log runs
+    python -m shared.run_log status <run_id>
+    python -m shared.run_log complete <run_id> accommodation --details '{"actual_count": 10}'
+    python -m shared.run_log export <run_id> files/process/execution_state.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+DB_PATH = Path("files/process/runs.sqlite3")
+DB_ENV = "AGENT_RUN_DB"
+
+STARTED = "step_started"
+COMPLETED = "completed"
+FAILED = "step_failed"
+INITIALIZED = "workflow_initialized"
+WORKFLOW_COMPLETED = "workflow_completed"
+CLAIMED = "claimed"
+RELEASED = "released"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      TEXT PRIMARY KEY,
+    workflow    TEXT NOT NULL,
+    subject     TEXT NOT NULL,
+    steps       TEXT NOT NULL,
+    created_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_subject ON runs (workflow, subject, created_at);
+CREATE TABLE IF NOT EXISTS events (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id      TEXT NOT NULL REFERENCES runs (run_id),
+    timestamp   TEXT NOT NULL,
+    event       TEXT NOT NULL,
+    agent       TEXT,
+    details     TEXT
+);
+CREATE INDEX IF NOT EXISTS events_run ON events (run_id, seq);
+"""
+
+
+class RunLog:
+    def __init__(self, path: str | Path | None = None, timeout: float = 30.0):
+        self.path = Path(path or os.environ.get(DB_ENV) or DB_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> RunLog:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def create_run(self, workflow: str, subject: str, steps: list[str], details: dict | None = None) -> str:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            run_id = self._create_run(workflow, subject, steps, details)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return run_id
+
+    def _create_run(self, workflow: str, subject: str, steps: list[str], details: dict | None) -> str:
+        run_id = uuid.uuid4().hex[:12]
+        now = datetime.now().isoformat()
+        self.conn.execute(
+            "INSERT INTO runs (run_id, workflow, subject, steps, created_at) VALUES (?, ?, ?, ?, ?)",
+            (run_id, workflow, subject, json.dumps(steps), now),
+        )
+        self._insert(run_id, INITIALIZED, None, {"subject": subject, **(details or {})}, now)
+        return run_id
+
+    def claim(
+        self,
+        workflow: str,
+        subject: str,
+        steps: list[str],
+        owner: str,
+        lease_seconds: float,
+        resume: bool = True,
+        details: dict | None = None,
+    ) -> tuple[str, bool] | None:
+        """Claim the subject's unfinished run (or a new one) for ``owner``.
+
+        Returns ``(run_id, resumed)``, or None when another live owner holds
+        the subject's latest run. Choosing the run and recording the claim
+        happen in one write transaction.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            run_id = self._latest_run(workflow, subject)
+            if run_id is not None:
+                holder = self._holder(run_id)
+                if holder is not None and holder != owner:
+                    self.conn.execute("ROLLBACK")
+                    return None
+                if not resume or self._snapshot(run_id)["workflow"]["workflow_complete"]:
+                    run_id = None
+            resumed = run_id is not None
+            if run_id is None:
+                run_id = self._create_run(workflow, subject, steps, details)
+            self._insert(run_id, CLAIMED, None, _lease(owner, lease_seconds), datetime.now().isoformat())
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        return run_id, resumed
+
+    def renew(self, run_id: str, owner: str, lease_seconds: float) -> None:
+        """Extend ``owner``'s claim on a run it is still working on."""
+        self.append(run_id, CLAIMED, None, _lease(owner, lease_seconds))
+
+    def release(self, run_id: str, owner: str) -> None:
+        self.append(run_id, RELEASED, None, {"owner": owner})
+
+    def _holder(self, run_id: str) -> str | None:
+        """Owner of a live claim on ``run_id``, if any."""
+        row = self.conn.execute(
+            "SELECT event, details FROM events WHERE run_id = ? AND event IN (?, ?) ORDER BY seq DESC LIMIT 1",
+            (run_id, CLAIMED, RELEASED),
+        ).fetchone()
+        if row is None or row[0] != CLAIMED:
+            return None
+        lease = json.loads(row[1] or "{}")
+        if datetime.fromisoformat(lease["expires_at"]) <= datetime.now():
+            return None
+        if lease.get("host") == socket.gethostname() and not _alive(int(lease.get("pid") or 0)):
+            return None
+        return lease["owner"]
+
+    def _insert(self, run_id: str, event: str, agent: str | None, details: dict | None, timestamp: str) -> None:
+        self.conn.execute(
+            "INSERT INTO events (run_id, timestamp, event, agent, details) VALUES (?, ?, ?, ?, ?)",
+            (run_id, timestamp, event, agent, json.dumps(details or {}, default=str)),
+        )
+
+    def append(self, run_id: str, event: str, agent: str | None = None, details: dict | None = None) -> None:
+        """Append one event; a single autocommitted INSERT."""
+        self._insert(run_id, event, agent, details, datetime.now().isoformat())
+
+    def latest_run(self, workflow: str, subject: str) -> str | None:
+        return self._latest_run(workflow, subject)
+
+    def _latest_run(self, workflow: str, subject: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT run_id FROM runs WHERE workflow = ? AND subject = ? ORDER BY created_at DESC LIMIT 1",
+            (workflow, subject),
+        ).fetchone()
+        return row[0] if row else None
+
+    def runs(self, workflow: str | None = None) -> list[dict]:
+        query = "SELECT run_id, workflow, subject, created_at FROM runs"
+        params: tuple = ()
+        if workflow:
+            query += " WHERE workflow = ?"
+            params = (workflow,)
+        rows = self.conn.execute(query + " ORDER BY created_at", params).fetchall()
+        return [dict(zip(("run_id", "workflow", "subject", "created_at"), row)) for row in rows]
+
+    def snapshot(self, run_id: str) -> dict:
+        """Fold the run's events into the ``execution_state.json`` shape."""
+        self.conn.execute("BEGIN")
+        try:
+            return self._snapshot(run_id)
+        finally:
+            self.conn.execute("COMMIT")
+
+    def _snapshot(self, run_id: str) -> dict:
+        run = self.conn.execute(
+            "SELECT workflow, subject, steps, created_at FROM runs WHERE run_id = ?", (run_id,)
+        ).fetchone()
+        events = self.conn.execute(
+            "SELECT timestamp, event, agent, details FROM events WHERE run_id = ? ORDER BY seq", (run_id,)
+        ).fetchall()
+        if run is None:
+            raise KeyError(f"unknown run: {run_id}")
+
+        workflow, subject, steps, created_at = run[0], run[1], json.loads(run[2]), run[3]
+        history, completed, failed = [], [], None
+        for timestamp, event, agent, details in events:
+            entry: dict[str, Any] = {"timestamp": timestamp, "event": event}
+            if agent:
+                entry["agent"] = agent
+            entry["details"] = json.loads(details) if details else {}
+            history.append(entry)
+            if event == COMPLETED and agent not in completed:
+                completed.append(agent)
+                failed = None
+            elif event == FAILED:
+                failed = agent
+            elif event == STARTED and agent == failed:
+                failed = None
+
+        remaining = [s for s in steps if s not in completed]
+        done = not remaining
+        status = "completed" if done else "failed" if failed else "in_progress" if len(history) > 1 else "initialized"
+        subject_ids = dict(part.split("=", 1) for part in subject.split(",") if "=" in part)
+        return {
+            "schema_version": "1.0",
+            "run_id": run_id,
+            "workflow": {
+                "name": workflow,
+                "status": status,
+                "current_step": len(completed),
+                "next_agent": remaining[0] if remaining else None,
+                "started_at": created_at,
+                **subject_ids,
+                "steps": steps,
+                "completed_steps": completed,
+                "workflow_complete": done,
+            },
+            "history": history,
+            "metadata": {
+                "last_updated": history[-1]["timestamp"] if history else created_at,
+                "event_count": len(history),
+            },
+        }
+
+    def completed_steps(self, run_id: str) -> list[str]:
+        return self.snapshot(run_id)["workflow"]["completed_steps"]
+
+    def export_json(self, run_id: str, path: str | Path) -> Path:
+        """Write the snapshot via a temp file + rename so readers never see a partial file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.snapshot(run_id), indent=2))
+        os.replace(tmp, path)
+        return path
+
+
+def _lease(owner: str, lease_seconds: float) -> dict:
+    expires = datetime.now() + timedelta(seconds=lease_seconds)
+    return {"owner": owner, "host": socket.gethostname(), "pid": os.getpid(), "expires_at": expires.isoformat()}
+
+
+def _alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def owner_id() -> str:
+    """Identifies this process as a claim owner."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def subject_key(**ids: str | None) -> str:
+    """Stable run subject, e.g. ``occasion_id=...`` or ``occasion_id=...,user_id=...``."""
+    return ",".join(f"{k}={v}" for k, v in sorted(ids.items()) if v)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect or append to the workflow event log")
+    parser.add_argument("--db", type=Path)
+    sub = parser.add_subparsers(dest="command", required=True)
+    runs_cmd = sub.add_parser("runs", help="List runs")
+    runs_cmd.add_argument("--workflow")
+    status_cmd = sub.add_parser("status", help="Current snapshot of a run")
+    status_cmd.add_argument("run_id")
+    for name in ("complete", "fail"):
+        cmd = sub.add_parser(name, help=f"Append a {COMPLETED if name == 'complete' else FAILED} event")
+        cmd.add_argument("run_id")
+        cmd.add_argument("step")
+        cmd.add_argument("--details", default="{}", help="JSON object")
+    export_cmd = sub.add_parser("export", help="Write the snapshot as execution_state.json")
+    export_cmd.add_argument("run_id")
+    export_cmd.add_argument("path", type=Path)
+    args = parser.parse_args()
+
+    with RunLog(args.db) as log:
+        if args.command == "runs":
+            result: Any = log.runs(args.workflow)
+        elif args.command == "status":
+            result = log.snapshot(args.run_id)
+        elif args.command in ("complete", "fail"):
+            event = COMPLETED if args.command == "complete" else FAILED
+            log.append(args.run_id, event, args.step, json.loads(args.details))
+            result = log.snapshot(args.run_id)["workflow"]
+        else:
+            result = {"path": str(log.export_json(args.run_id, args.path))}
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Minimal PostgREST client for Supabase tables and RPCs.
+
+Talks to ``{SUPABASE_URL}/rest/v1`` directly with ``requests`` so batch
+writes can be chunked explicitly and any local Postgres + PostgREST or stub
+server can stand in for Supabase.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Iterator
+
+from shared.api_client import ApiClient
+
+PAGE_SIZE = 1000
+
+
+def in_filter(values: list[str]) -> str:
+    """PostgREST ``in.(...)`` filter with every value double-quoted."""
+    quoted = ('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return "in.(" + ",".join(quoted) + ")"
+
+
+class SupabaseRest(ApiClient):
+    BASE_URL_ENV = "SUPABASE_URL"
+
+    def __init__(self, url: str | None = None, key: str | None = None, **kwargs):
+        url = url or os.environ.get("SUPABASE_URL")
+        key = key or os.environ.get("SUPABASE_KEY")
+        if not url or not key:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+        headers = {"apikey": key, "Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+        kwargs.setdefault("use_cache", False)
+        super().__init__(base_url=url.rstrip("/") + "/rest/v1", headers=headers, **kwargs)
+
+    def select(self, table: str, filters: dict[str, str], columns: str = "*", order: str | None = None) -> Iterator[dict]:
+        """Yield matching rows page by page."""
+        offset = 0
+        while True:
+            params = {**filters, "select": columns, "limit": PAGE_SIZE, "offset": offset}
+            if order:
+                params["order"] = order
+            rows = self.get(f"/{table}", params) or []
+            yield from rows
+            if len(rows) < PAGE_SIZE:
+                return
+            offset += PAGE_SIZE
+
+    def upsert(self, table: str, rows: list[dict], on_conflict: str) -> None:
+        self.post(
+            f"/{table}",
+            rows,
+            params={"on_conflict": on_conflict},
+            headers={"Prefer": "resolution=merge-duplicates,return=minimal"},
+        )
+
+    def update(self, table: str, filters: dict[str, str], values: dict) -> None:
+        self.request("PATCH", f"/{table}", params=filters, json_body=values, headers={"Prefer": "return=minimal"})
+
+    def delete(self, table: str, filters: dict[str, str]) -> None:
+        self.request("DELETE", f"/{table}", params=filters, headers={"Prefer": "return=minimal"})
+
+    def rpc(self, function: str, args: dict) -> Any:
+        return self.post(f"/rpc/{function}", args)
@@ -0,0 +1,211 @@
+"""Precomputed hotel/activity travel times for an occasion.
+
+Rows cover every hotel and activity of the masterlists, columns every
+activity. Times come from batched Distance Matrix calls; any element the
+API cannot answer (or every element, with ``estimate_only``) falls back to
+a haversine distance scaled by a road factor. The result is stored as a
+compact ``.npz`` next to the masterlist, so verification and revision look
+travel times up in O(1) instead of calling the Directions API per pair.
+"""
+
+from __future__ import annotations
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from shared.geo import haversine_km
+from shared.ratelimit import retry_with_backoff
+
+# Straight-line distance -> road distance, and average door-to-door speeds.
+ROAD_FACTOR = 1.3
+SPEED_KMH = {"driving": 50.0, "walking": 4.8, "bicycling": 15.0, "transit": 30.0}
+
+# Distance Matrix limits: 25 origins/destinations and 100 elements per request.
+MAX_ORIGINS = 4
+MAX_DESTINATIONS = 25
+
+SOURCE_API = 0
+SOURCE_ESTIMATE = 1
+
+
+@dataclass(frozen=True)
+class Point:
+    id: str
+    kind: str  # "hotel" or "activity"
+    latitude: float
+    longitude: float
+
+
+def points_from_masterlists(accommodations: Iterable[dict], activities: Iterable[dict]) -> list[Point]:
+    """Hotels first, then activities; items without coordinates are skipped."""
+    points, seen = [], set()
+    for kind, items in (("hotel", accommodations), ("activity", activities)):
+        for item in items:
+            if item.get("id") in seen or item.get("latitude") is None or item.get("longitude") is None:
+                continue
+            seen.add(item["id"])
+            points.append(Point(str(item["id"]), kind, float(item["latitude"]), float(item["longitude"])))
+    return points
+
+
+def estimate(lat1, lon1, lat2, lon2, mode: str = "driving") -> tuple[np.ndarray, np.ndarray]:
+    """Road-factor estimate of ``(seconds, meters)``; arguments broadcast."""
+    km = haversine_km(lat1, lon1, lat2, lon2) * ROAD_FACTOR
+    seconds = km / SPEED_KMH.get(mode, SPEED_KMH["driving"]) * 3600.0
+    return np.rint(seconds).astype(np.int32), np.rint(km * 1000.0).astype(np.int32)
+
+
+class TravelMatrix:
+    def __init__(
+        self,
+        ids: np.ndarray,
+        kinds: np.ndarray,
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        dest_ids: np.ndarray,
+        seconds: np.ndarray,
+        meters: np.ndarray,
+        source: np.ndarray,
+        meta: dict,
+    ):
+        self.ids, self.kinds = ids, kinds
+        self.latitude, self.longitude = latitude, longitude
+        self.dest_ids = dest_ids
+        self.seconds, self.meters, self.source = seconds, meters, source
+        self.meta = meta
+        self._row = {pid: i for i, pid in enumerate(ids.tolist())}
+        self._col = {pid: j for j, pid in enumerate(dest_ids.tolist())}
+
+    @classmethod
+    def build(
+        cls,
+        points: list[Point],
+        client=None,
+        mode: str = "driving",
+        workers: int = 4,
+        meta: dict | None = None,
+    ) -> TravelMatrix:
+        """Estimate every pair, then overwrite with API answers when ``client`` is given."""
+        ids = np.array([p.id for p in points])
+        lat = np.array([p.latitude for p in points])
+        lon = np.array([p.longitude for p in points])
+        dest = np.array([i for i, p in enumerate(points) if p.kind == "activity"], dtype=np.int64)
+        seconds, meters = estimate(lat[:, None], lon[:, None], lat[dest][None, :], lon[dest][None, :], mode)
+        source = np.full(seconds.shape, SOURCE_ESTIMATE, dtype=np.uint8)
+        api_requests = failed_requests = 0
+
+        if client is not None and len(dest):
+            coords = [f"{a:.6f},{b:.6f}" for a, b in zip(lat, lon)]
+            tiles = [
+                (r, c)
+                for r in range(0, len(points), MAX_ORIGINS)
+                for c in range(0, len(dest), MAX_DESTINATIONS)
+            ]
+
+            def fetch(tile):
+                r, c = tile
+                origins = coords[r:r + MAX_ORIGINS]
+                destinations = [coords[k] for k in dest[c:c + MAX_DESTINATIONS]]
+                try:
+                    return tile, retry_with_backoff(lambda: client.distance_matrix(origins, destinations, mode=mode))
+                except Exception:
+                    # The tile keeps its estimates; a failed batch must not fail the build.
+                    return tile, None
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for (r, c), response in pool.map(fetch, tiles):
+                    api_requests += 1
+                    if response is None:
+                        failed_requests += 1
+                        continue
+                    for i, row in enumerate(response.get("rows", [])):
+                        for j, element in enumerate(row.get("elements", [])):
+                            if element.get("status") != "OK":
+                                continue
+                            seconds[r + i, c + j] = element["duration"]["value"]
+                            meters[r + i, c + j] = element["distance"]["value"]
+                            source[r + i, c + j] = SOURCE_API
+
+        meta = {
+            "mode": mode,
+            "built_at": datetime.now().isoformat(),
+            "api_requests": api_requests,
+            "failed_requests": failed_requests,
+            "api_elements": int((source == SOURCE_API).sum()),
+            "estimated_elements": int((source == SOURCE_ESTIMATE).sum()),
+            **(meta or {}),
+        }
+        kinds = np.array([p.kind for p in points])
+        return cls(ids, kinds, lat, lon, ids[dest], seconds, meters, source, meta)
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as fh:
+            np.savez_compressed(
+                fh,
+                ids=self.ids,
+                kinds=self.kinds,
+                latitude=self.latitude,
+                longitude=self.longitude,
+                dest_ids=self.dest_ids,
+                seconds=self.seconds,
+                meters=self.meters,
+                source=self.source,
+                meta=np.array(json.dumps(self.meta)),
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> TravelMatrix:
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                data["ids"],
+                data["kinds"],
+                data["latitude"],
+                data["longitude"],
+                data["dest_ids"],
+                data["seconds"],
+                data["meters"],
+                data["source"],
+                json.loads(str(data["meta"])),
+            )
+
+    def __contains__(self, place_id: str) -> bool:
+        return place_id in self._row
+
+    def lookup(self, origin: str, destination: str) -> dict:
+        """Travel time between two masterlist ids.
+
+        Activity destinations are stored directly; a hotel destination uses
+        the reverse leg (times are near-symmetric by road), and hotel->hotel
+        pairs are estimated from the stored coordinates.
+        """
+        if origin == destination:
+            return {"seconds": 0, "meters": 0, "source": "api"}
+        if origin in self._row and destination in self._col:
+            i, j = self._row[origin], self._col[destination]
+        elif destination in self._row and origin in self._col:
+            i, j = self._row[destination], self._col[origin]
+        elif origin in self._row and destination in self._row:
+            a, b = self._row[origin], self._row[destination]
+            sec, m = estimate(
+                self.latitude[a], self.longitude[a], self.latitude[b], self.longitude[b], self.meta["mode"]
+            )
+            return {"seconds": int(sec), "meters": int(m), "source": "estimate"}
+        else:
+            raise KeyError(f"no travel time for {origin} -> {destination}")
+        return {
+            "seconds": int(self.seconds[i, j]),
+            "meters": int(self.meters[i, j]),
+            "source": "api" if self.source[i, j] == SOURCE_API else "estimate",
+        }
+
+    def seconds_between(self, origin: str, destination: str) -> int:
+        return self.lookup(origin, destination)["seconds"]
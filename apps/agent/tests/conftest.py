@@ -0,0 +1,35 @@
+"""Test setup: ``shared`` and the skill scripts on ``sys.path`` (as the scripts do themselves) and a stub server."""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+AGENT_DIR = Path(__file__).resolve().parents[1]
+SCRIPTS = {
+    "inventory": AGENT_DIR / "inventory" / ".claude" / "skills" / "orchestrating-workflow" / "scripts",
+    "duffel": AGENT_DIR / "inventory" / ".claude" / "skills" / "duffel" / "scripts",
+    "google-maps": AGENT_DIR / "inventory" / ".claude" / "skills" / "google-maps" / "scripts",
+    "revision": AGENT_DIR / "revision" / ".claude" / "skills" / "orchestrating-workflow" / "scripts",
+}
+
+for path in (AGENT_DIR, *SCRIPTS.values()):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from shared.replay_stubs import Fixtures, ReplayServer, StubState  # noqa: E402
+
+HOTELS = [
+    {"id": f"lp{i}", "name": f"Hotel {i}", "latitude": 43.47 + i / 1000, "longitude": 10.74, "rating": 8.0}
+    for i in range(5)
+]
+
+
+@pytest.fixture
+def stub():
+    """A running replay stub server (Duffel stays, Google Maps, Supabase PostgREST)."""
+    state = StubState(Fixtures(list(HOTELS), {"museum": [{"id": "ChIJm", "name": "Museo"}]}, (43.47, 10.74)))
+    with ReplayServer(state) as server:
+        yield server
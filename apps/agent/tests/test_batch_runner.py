@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from shared import batch_runner
+from shared.batch_runner import Job, Pipeline, Step, run_batch, run_job
+from shared.run_log import CLAIMED, RunLog
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "runs.sqlite3")
+
+
+def _pipeline(*commands: list[str]) -> Pipeline:
+    return Pipeline("inventory", tuple(Step(f"step{i}", tuple(c)) for i, c in enumerate(commands)))
+
+
+def test_claim_is_exclusive_until_released(db):
+    with RunLog(db) as a, RunLog(db) as b:
+        first = a.claim("inventory", "occasion_id=o1", ["s"], "worker-a", 60)
+        assert first is not None and first[1] is False
+        assert b.claim("inventory", "occasion_id=o1", ["s"], "worker-b", 60) is None
+        assert b.claim("inventory", "occasion_id=o2", ["s"], "worker-b", 60) is not None
+
+        a.release(first[0], "worker-a")
+        again = b.claim("inventory", "occasion_id=o1", ["s"], "worker-b", 60)
+        assert again == (first[0], True)  # the unfinished run is resumed, not duplicated
+
+
+def test_expired_or_dead_claims_are_taken_over(db):
+    with RunLog(db) as log:
+        run_id, _ = log.claim("inventory", "occasion_id=o1", ["s"], "worker-a", -1)
+        assert log.claim("inventory", "occasion_id=o1", ["s"], "worker-b", 60) == (run_id, True)
+
+        dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        lease = json.loads(log.conn.execute(
+            "SELECT details FROM events WHERE event = ? ORDER BY seq DESC LIMIT 1", (CLAIMED,)
+        ).fetchone()[0])
+        log.append(run_id, CLAIMED, None, {**lease, "owner": "worker-c", "pid": int(dead.stdout)})
+        assert log.claim("inventory", "occasion_id=o1", ["s"], "worker-d", 60) == (run_id, True)
+
+
+def test_concurrent_claims_pick_one_owner(db):
+    RunLog(db).close()
+    barrier = threading.Barrier(8)
+
+    def claim(i):
+        with RunLog(db) as log:
+            barrier.wait()
+            return log.claim("inventory", "occasion_id=o1", ["s"], f"worker-{i}", 60)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(claim, range(8)))
+    assert sum(r is not None for r in results) == 1
+    with RunLog(db) as log:
+        assert len(log.runs()) == 1
+
+
+def test_busy_subject_is_skipped(db, tmp_path):
+    pipeline = _pipeline([sys.executable, "-c", "print('{}')"])
+    with RunLog(db) as log:
+        run_id, _ = log.claim("inventory", "occasion_id=o1", ["step0"], "other-batch", 60)
+
+    result = run_job(Job("o1"), pipeline, db, str(tmp_path))
+
+    assert result["busy"] is True and result["run_id"] == run_id and result["ran"] == []
+
+
+def test_duplicate_jobs_run_once(db, tmp_path):
+    pipeline = _pipeline(["python", "-c", "print('{\"ok\": true}')"])
+
+    result = run_batch([Job("o1"), Job("o1"), Job("o2")], pipeline, db, tmp_path, workers=2)
+
+    assert result["jobs"] == 2 and result["duplicates"] == 1
+    assert result["completed"] == 2 and result["busy"] == 0
+    with RunLog(db) as log:
+        assert len(log.runs()) == 2
+
+
+def test_long_step_renews_its_lease(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_runner, "LEASE_SECONDS", 0.3)
+    pipeline = _pipeline([sys.executable, "-c", "import time; time.sleep(0.5)"])
+
+    result = run_job(Job("o1"), pipeline, db, str(tmp_path))
+
+    assert result["failed"] is None
+    with RunLog(db) as log:
+        renewals = log.conn.execute("SELECT COUNT(*) FROM events WHERE event = ?", (CLAIMED,)).fetchone()[0]
+    assert renewals >= 3  # the claim plus at least two renewals while the step slept
+
+
+def test_step_timeout_fails_the_step(db, tmp_path):
+    pipeline = Pipeline("inventory", (Step("slow", (sys.executable, "-c", "import time; time.sleep(5)"), 0.2),))
+
+    result = run_job(Job("o1"), pipeline, db, str(tmp_path))
+
+    assert result["failed"] == "slow"
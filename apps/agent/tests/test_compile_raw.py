@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from compile_raw import RawCompiler
+from shared.raw_store import RawWriter
+
+
+def _write(path, items, fresh=True, **meta):
+    with RawWriter(path, meta=meta, fresh=fresh) as writer:
+        writer.append_page(items)
+
+
+@pytest.fixture
+def compiler(tmp_path):
+    compiler = RawCompiler(tmp_path / "compiled.sqlite3")
+    yield compiler
+    compiler.close()
+
+
+def _compiled(compiler, kind="activities"):
+    return {item["id"]: item for item in compiler.iter_compiled(kind)}
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz"])
+def test_appended_pages_are_read_once(tmp_path, compiler, suffix):
+    raw = tmp_path / "raw"
+    path = raw / f"museums{suffix}"
+    _write(path, [{"id": "a"}, {"id": "b"}])
+
+    first = compiler.compile_dir("activities", raw)
+    RawWriter(path).append_page([{"id": "c"}])
+    second = compiler.compile_dir("activities", raw)
+    third = compiler.compile_dir("activities", raw)
+
+    assert first["items_read"] == 2
+    assert second["items_read"] == 1
+    assert third["items_read"] == 0 and third["files_skipped"] == 1
+    assert sorted(_compiled(compiler)) == ["a", "b", "c"]
+
+
+def test_replaced_file_only_drops_its_own_items(tmp_path, compiler):
+    raw = tmp_path / "raw"
+    _write(raw / "museums.jsonl", [{"id": "a", "v": 1}, {"id": "shared", "v": 1}])
+    _write(raw / "parks.jsonl", [{"id": "p"}, {"id": "shared", "v": 2}])
+    compiler.compile_dir("activities", raw)
+
+    _write(raw / "museums.jsonl", [{"id": "a2"}, {"id": "shared", "v": 3}])
+    result = compiler.compile_dir("activities", raw)
+
+    assert result["files_replaced"] == 1 and result["items_dropped"] == 2
+    assert result["files_parsed"] == 1 and result["files_skipped"] == 1
+    assert result["items_read"] == 2
+    items = _compiled(compiler)
+    assert sorted(items) == ["a2", "p", "shared"]
+    assert items["shared"]["v"] == 3  # the most recently read copy wins
+    assert result["unique_item_count"] == 3
+
+
+def test_removed_file_keeps_items_other_files_still_have(tmp_path, compiler):
+    raw = tmp_path / "raw"
+    _write(raw / "museums.jsonl", [{"id": "a"}, {"id": "shared", "v": 1}])
+    _write(raw / "parks.jsonl", [{"id": "p"}, {"id": "shared", "v": 2}])
+    compiler.compile_dir("activities", raw)
+
+    (raw / "parks.jsonl").unlink()
+    result = compiler.compile_dir("activities", raw)
+
+    assert result["files_removed"] == 1 and result["items_dropped"] == 2
+    assert result["items_read"] == 0
+    items = _compiled(compiler)
+    assert sorted(items) == ["a", "shared"]
+    assert items["shared"]["v"] == 1
+    assert result["raw_file_count"] == 1 and result["raw_item_count"] == 2
+
+
+def test_fresh_rerun_does_not_duplicate(tmp_path, compiler):
+    raw = tmp_path / "raw"
+    for _ in range(3):
+        _write(raw / "museums.jsonl", [{"id": "a"}, {"id": "b"}])
+        result = compiler.compile_dir("activities", raw)
+    assert result["raw_item_count"] == 2 and result["unique_item_count"] == 2
+
+
+def test_older_schema_is_dropped(tmp_path):
+    db = tmp_path / "compiled.sqlite3"
+    conn = sqlite3.connect(db)
+    conn.executescript("CREATE TABLE items (kind TEXT, id TEXT, body TEXT); PRAGMA user_version = 2;")
+    conn.close()
+
+    compiler = RawCompiler(db)
+    try:
+        _write(tmp_path / "raw" / "m.jsonl", [{"id": "a"}])
+        assert compiler.compile_dir("activities", tmp_path / "raw")["unique_item_count"] == 1
+    finally:
+        compiler.close()
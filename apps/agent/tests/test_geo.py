@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pytest
+
+from shared.geo import EARTH_RADIUS_KM, KM_PER_DEGREE_LAT, GridIndex, bounding_box, haversine_km
+
+
+def _destination(latitude: float, longitude: float, bearing_deg: float, km: float) -> tuple[float, float]:
+    """Point ``km`` from the start along ``bearing_deg`` on the haversine sphere."""
+    d = km / EARTH_RADIUS_KM
+    lat1, lon1, bearing = math.radians(latitude), math.radians(longitude), math.radians(bearing_deg)
+    lat2 = math.asin(math.sin(lat1) * math.cos(d) + math.cos(lat1) * math.sin(d) * math.cos(bearing))
+    lon2 = lon1 + math.atan2(
+        math.sin(bearing) * math.sin(d) * math.cos(lat1), math.cos(d) - math.sin(lat1) * math.sin(lat2)
+    )
+    return math.degrees(lat2), math.degrees(lon2)
+
+
+def test_degree_length_matches_haversine_sphere():
+    assert haversine_km(0.0, 0.0, 1.0, 0.0) == pytest.approx(KM_PER_DEGREE_LAT, rel=1e-12)
+
+
+def test_point_just_inside_radius_across_a_cell_edge():
+    # The point sits 0.00005 deg above the 43.6 cell edge; the query centre is
+    # 24.98 km south of it, so the box edge must reach past the cell boundary.
+    point_lat, lon = 43.60005, 10.0
+    query_lat = 43.59995 - 25 / 111.32
+    index = GridIndex(np.array([point_lat]), np.array([lon]), cell_deg=0.1)
+
+    idx, dist = index.query_radius(query_lat, lon, 25.0)
+
+    assert haversine_km(query_lat, lon, point_lat, lon) < 25.0
+    assert idx.tolist() == [0]
+    assert dist[0] < 25.0
+
+
+@pytest.mark.parametrize("latitude", [0.0, 43.6, -61.0, 78.0])
+@pytest.mark.parametrize("bearing", [0.0, 45.0, 90.0, 180.0, 270.0, 315.0])
+def test_points_on_the_circle_are_found(latitude, bearing):
+    radius = 25.0
+    point = _destination(latitude, 10.0, bearing, radius * (1 - 1e-9))
+    index = GridIndex(np.array([point[0]]), np.array([point[1]]), cell_deg=0.1)
+
+    idx, _ = index.query_radius(latitude, 10.0, radius)
+
+    assert idx.tolist() == [0]
+
+
+def test_grid_matches_full_scan():
+    rng = np.random.default_rng(7)
+    lat = rng.uniform(43.0, 44.0, 5000)
+    lon = rng.uniform(10.0, 11.0, 5000)
+    index = GridIndex(lat, lon, cell_deg=0.05)
+
+    for q_lat, q_lon, radius in [(43.5, 10.5, 25.0), (43.05, 10.95, 10.0), (43.6, 10.3, 0.5)]:
+        idx, _ = index.query_radius(q_lat, q_lon, radius)
+        expected = np.flatnonzero(haversine_km(q_lat, q_lon, lat, lon) <= radius)
+        assert sorted(idx.tolist()) == expected.tolist()
+
+
+def test_bounding_box_falls_back_near_poles_and_antimeridian():
+    assert bounding_box(89.9, 0.0, 25.0) is None
+    assert bounding_box(0.0, 179.9, 25.0) is None
+    assert bounding_box(43.6, 10.0, 25.0) is not None
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from shared.api_client import ApiClient, ApiError
+from shared.instrumentation import recorder, span
+from shared.ratelimit import retry_with_backoff
+
+
+class Flaky(BaseHTTPRequestHandler):
+    """Answers 503 to the first ``failures`` requests, then 200."""
+
+    failures = 0
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        status = 503 if Flaky.failures > 0 else 200
+        Flaky.failures -= 1
+        body = json.dumps({"ok": status == 200}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FlakyClient(ApiClient):
+    pass
+
+
+@pytest.fixture
+def client():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Flaky)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    recorder.reset()
+    yield FlakyClient(f"http://127.0.0.1:{server.server_address[1]}", use_cache=False)
+    recorder.reset()
+    server.shutdown()
+    server.server_close()
+
+
+def test_retries_count_against_the_failed_call(client):
+    Flaky.failures = 2
+    with span("inventory.activities.search"):
+        assert retry_with_backoff(lambda: client.get("/places/search"), base_delay=0) == {"ok": True}
+
+    api = recorder.summary()["api"]
+    assert list(api) == ["inventory.activities.search"]
+    stats = api["inventory.activities.search"]["FlakyClient GET /places/search"]
+    assert (stats["calls"], stats["errors"], stats["retries"]) == (3, 2, 2)
+
+
+def test_exhausted_retries_and_other_errors(client):
+    Flaky.failures = 5
+    with span("planning.travel_matrix"), pytest.raises(ApiError):
+        retry_with_backoff(lambda: client.get("/matrix"), attempts=3, base_delay=0)
+
+    failures = [requests.ConnectionError("reset")]
+
+    def outside_a_client():
+        if failures:
+            raise failures.pop()
+        return "done"
+
+    with span("planning.travel_matrix"):
+        assert retry_with_backoff(outside_a_client, base_delay=0) == "done"
+
+    calls = recorder.summary()["api"]["planning.travel_matrix"]
+    assert calls["FlakyClient GET /matrix"]["retries"] == 2
+    assert calls["-"]["retries"] == 1 and calls["-"]["calls"] == 0
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import pytest
+
+import masterlist_sync
+from masterlist_sync import ITEMS_TABLE, MasterlistSync, UnsafeSync, chunk_rows, compute_delta
+from shared.supabase_rest import SupabaseRest
+
+OCCASION = "occ-1"
+
+
+def _items(n: int, **changes) -> list[dict]:
+    items = [{"id": f"lp{i}", "name": f"Hotel {i}", "rating": 8.0} for i in range(n)]
+    for item in items:
+        item.update(changes.get(item["id"], {}))
+    return items
+
+
+@pytest.fixture
+def sync(stub):
+    stub.state.tables["occasions"] = [{"id": OCCASION, "accommodations": [], "activities": []}]
+    return MasterlistSync(SupabaseRest(stub.url, "service-key"), OCCASION)
+
+
+def _stored(stub) -> dict[str, dict]:
+    return {r["item_id"]: r["item"] for r in stub.state.tables.get(ITEMS_TABLE, [])}
+
+
+def _masterlist(stub) -> list[dict]:
+    return stub.state.tables["occasions"][0]["accommodations"]
+
+
+def test_compute_delta():
+    delta = compute_delta({"a": "1", "b": "2", "c": "3"}, {"b": "2", "c": "x", "d": "4"})
+    assert (delta.added, delta.changed, delta.removed, delta.unchanged) == ({"a"}, {"c"}, {"d"}, 1)
+
+
+def test_chunk_rows_bounds_count_and_bytes():
+    rows = [{"id": i, "pad": "x" * 100} for i in range(10)]
+    assert [len(b) for b in chunk_rows(rows, max_rows=4)] == [4, 4, 2]
+    assert all(len(b) == 1 for b in chunk_rows(rows, max_bytes=150))
+
+
+def test_sync_sends_only_the_delta(stub, sync):
+    first = sync.sync("accommodations", lambda: iter(_items(5)))
+    assert (first["added"], first["rebuilt"], first["masterlist_count"]) == (5, True, 5)
+
+    before = stub.state.requests
+    unchanged = sync.sync("accommodations", lambda: iter(_items(5, lp0={"search_date": "2026-07-01"})))
+    assert unchanged["unchanged"] == 5 and unchanged["rebuilt"] is False
+    assert stub.state.requests - before == 2  # one hash select, one pending check; no writes
+
+    items = [i for i in _items(6, lp1={"rating": 9.0}) if i["id"] != "lp2"]
+    result = sync.sync("accommodations", lambda: iter(items))
+    assert (result["added"], result["changed"], result["removed"], result["unchanged"]) == (1, 1, 1, 3)
+    assert result["upsert_batches"] == 1 and result["delete_batches"] == 1
+    assert sorted(_stored(stub)) == ["lp0", "lp1", "lp3", "lp4", "lp5"]
+    assert _stored(stub)["lp1"]["rating"] == 9.0
+    assert [i["id"] for i in _masterlist(stub)] == ["lp0", "lp1", "lp3", "lp4", "lp5"]
+
+
+def test_writes_are_chunked(stub, sync, monkeypatch):
+    monkeypatch.setattr(masterlist_sync, "MAX_CHUNK_ROWS", 4)
+    monkeypatch.setattr(masterlist_sync, "MAX_DELETE_IDS", 3)
+    monkeypatch.setattr(masterlist_sync, "chunk_rows", lambda rows: chunk_rows(rows, max_rows=4))
+
+    added = sync.sync("accommodations", lambda: iter(_items(10)))
+    removed = sync.sync("accommodations", lambda: iter(_items(10)[:3]), max_removed_fraction=1.0)
+
+    assert added["upsert_batches"] == 3
+    assert removed["delete_batches"] == 3 and removed["removed"] == 7
+    assert len(_masterlist(stub)) == 3
+
+
+def test_empty_or_truncated_source_is_refused(stub, sync):
+    sync.sync("accommodations", lambda: iter(_items(5)))
+    requests = stub.state.requests
+
+    with pytest.raises(UnsafeSync, match="no accommodations"):
+        sync.sync("accommodations", lambda: iter([]))
+    with pytest.raises(UnsafeSync, match="remove 3 of 5"):
+        sync.sync("accommodations", lambda: iter(_items(2)))
+    assert sync.sync("accommodations", lambda: iter([]), dry_run=True)["unsafe"]
+    assert len(_stored(stub)) == 5 and len(_masterlist(stub)) == 5
+    assert stub.state.requests - requests == 6  # reads only
+
+    emptied = sync.sync("accommodations", lambda: iter([]), allow_empty=True)
+    assert emptied["removed"] == 5 and _masterlist(stub) == []
+
+
+def test_failed_rebuild_is_finished_by_the_next_sync(stub, sync, monkeypatch):
+    def timeout(*args, **kwargs):
+        raise TimeoutError("rpc timed out")
+
+    monkeypatch.setattr(sync.client, "rpc", timeout)
+    with pytest.raises(TimeoutError):
+        sync.sync("accommodations", lambda: iter(_items(5)))
+    assert len(_stored(stub)) == 5 and _masterlist(stub) == []
+    monkeypatch.undo()
+
+    retry = sync.sync("accommodations", lambda: iter(_items(5)))
+    assert retry["unchanged"] == 5 and retry["pending"] is True and retry["rebuilt"] is True
+    assert len(_masterlist(stub)) == 5
+
+    settled = sync.sync("accommodations", lambda: iter(_items(5)))
+    assert settled["pending"] is False and settled["rebuilt"] is False
+
+
+def test_failed_delete_batch_is_finished_by_the_next_sync(stub, sync, monkeypatch):
+    sync.sync("accommodations", lambda: iter(_items(5)))
+    delete = sync.client.delete
+
+    def fail_once(*args, **kwargs):
+        monkeypatch.setattr(sync.client, "delete", delete)
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(sync.client, "delete", fail_once)
+    with pytest.raises(ConnectionError):
+        sync.sync("accommodations", lambda: iter(_items(5, lp0={"rating": 7.0})[:4]))
+    assert len(_masterlist(stub)) == 5
+
+    retry = sync.sync("accommodations", lambda: iter(_items(5, lp0={"rating": 7.0})[:4]))
+    assert retry["removed"] == 1 and retry["rebuilt"] is True
+    assert [i["id"] for i in _masterlist(stub)] == ["lp0", "lp1", "lp2", "lp3"]
+    assert _masterlist(stub)[0]["rating"] == 7.0
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import pytest
+
+from shared.ranking import TOKEN_SYNONYMS, FeatureTable, parse_preferences
+
+POOL = TOKEN_SYNONYMS["pool"]
+
+
+@pytest.mark.parametrize(
+    ("markdown", "required"),
+    [
+        ("Must have a pool", [POOL]),
+        ("- must-have: pools", [POOL]),
+        ("Must have free wifi and a gym", [{"wifi"}, TOKEN_SYNONYMS["gym"]]),
+        ("We really need a pool or a spa", [POOL | TOKEN_SYNONYMS["spa"]]),
+        ("I need a pool, not a spa", [POOL]),
+        ("I need a quiet room", [{"quiet_room"}]),
+        ("I don't need a spa", []),
+        ("I don’t need a spa", []),
+        ("No need for parking", []),
+        ("Dietary needs: vegetarian", []),
+    ],
+)
+def test_must_haves(markdown, required):
+    assert parse_preferences(markdown).required == required
+
+
+def test_must_have_with_article_filters_hotels():
+    items = [
+        {"id": "a", "source": "liteapi", "rating": 9.0, "facility_ids": [301]},
+        {"id": "b", "source": "liteapi", "rating": 9.5, "facility_ids": [96]},
+    ]
+    table = FeatureTable.build(items)
+    prefs = parse_preferences("Must have a pool\nI need a quiet room")
+
+    assert table.ids[table.eligible(prefs)].tolist() == ["a"]
+    assert table.unmatched(prefs) == [["quiet_room"]]
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import pytest
+
+from shared.raw_store import RawWriter, iter_items, iter_raw_files, read_meta
+
+
+@pytest.mark.parametrize("name", ["places.jsonl", "places.jsonl.gz"])
+def test_fresh_run_replaces_file_only_on_success(tmp_path, name):
+    path = tmp_path / name
+    with RawWriter(path, meta={"run": 1}, fresh=True) as writer:
+        writer.append_page([{"id": "a"}, {"id": "b"}])
+
+    with pytest.raises(RuntimeError):
+        with RawWriter(path, meta={"run": 2}, fresh=True) as writer:
+            writer.append_page([{"id": "c"}])
+            assert [i["id"] for i in iter_items(path)] == ["a", "b"]  # still the previous run
+            raise RuntimeError("query failed")
+
+    assert [i["id"] for i in iter_items(path)] == ["a", "b"]
+    assert read_meta(path)["run"] == 1
+    assert list(iter_raw_files(tmp_path)) == [path]  # the failed run's temp file is gone
+
+    with RawWriter(path, meta={"run": 3}, fresh=True) as writer:
+        writer.append_page([{"id": "d"}])
+    assert [i["id"] for i in iter_items(path)] == ["d"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [name]
+
+
+def test_appending_writer_writes_in_place(tmp_path):
+    path = tmp_path / "hotels.jsonl"
+    RawWriter(path).append_page([{"id": "a"}])
+    writer = RawWriter(path)
+    writer.append_page([{"id": "b", "facility_ids": [3, 1]}])
+
+    assert [i["id"] for i in iter_items(path)] == ["a", "b"]
+    assert list(iter_items(path))[1]["facility_ids"] == [1, 3]
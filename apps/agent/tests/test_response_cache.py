@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import pytest
+
+from shared import response_cache
+from shared.duffel_client import DuffelClient
+from shared.maps_client import MapsClient
+from shared.response_cache import MISS, ResponseCache
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(tmp_path / "responses.sqlite3")
+    yield cache
+    cache.close()
+
+
+def _search(client: DuffelClient) -> dict:
+    return client.search_stays(43.47, 10.74, 25, "2026-06-01", "2026-06-03")
+
+
+def test_repeated_search_is_served_from_cache(stub, cache):
+    client = DuffelClient("duffel_test_a", base_url=stub.url, cache=cache)
+
+    first = _search(client)
+    second = _search(client)
+
+    assert second == first
+    assert stub.state.requests == 1
+    counters = cache.stats()["endpoints"]["/stays/search"]
+    assert (counters["hits"], counters["misses"], counters["stores"]) == (1, 1, 1)
+
+
+def test_entries_expire_after_the_endpoint_ttl(stub, cache, clock):
+    client = DuffelClient("duffel_test_a", base_url=stub.url, cache=cache)
+    ttl = DuffelClient.CACHE_TTLS["/stays/search"]
+
+    _search(client)
+    clock.now += ttl - 1
+    _search(client)
+    assert stub.state.requests == 1
+
+    clock.now += 2
+    _search(client)
+    assert stub.state.requests == 2
+    assert cache.purge_expired() == 0  # the expired entry was replaced by the fresh response
+
+
+def test_base_url_and_credentials_are_part_of_the_key(stub, cache):
+    _search(DuffelClient("duffel_test_a", base_url=stub.url, cache=cache))
+    _search(DuffelClient("duffel_live_b", base_url=stub.url, cache=cache))
+    _search(DuffelClient("duffel_test_a", base_url=stub.url + "/", cache=cache))
+    assert stub.state.requests == 2  # test and live never share; a trailing slash is the same server
+
+    other = DuffelClient("duffel_test_a", base_url=stub.url.replace("127.0.0.1", "localhost"), cache=cache)
+    _search(other)
+    assert stub.state.requests == 3
+
+
+def test_unlisted_endpoints_and_writes_are_not_cached(stub, cache):
+    for endpoint in ("/air/payments", "/air/order_cancellations", "/air/order_change_requests", "/air/orders"):
+        assert response_cache.ttl_for(DuffelClient.CACHE_TTLS, endpoint) == 0
+    assert response_cache.ttl_for(DuffelClient.CACHE_TTLS, "/air/offer_requests") > 0
+
+    client = MapsClient("maps-key", base_url=stub.url, cache=cache)
+    for _ in range(2):
+        client.request("PATCH", "/maps/api/place/textsearch/json", params={"query": "museum"})
+    assert stub.state.requests == 2
+
+
+def test_cached_null_body_is_a_hit(cache):
+    key = cache.key_for("GET", "/x")
+    assert cache.get(key, "/x") is MISS
+    cache.put(key, "/x", None, ttl=60)
+    assert cache.get(key, "/x") is None
+
+
+def test_lru_eviction_keeps_recently_used_entries(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "responses.sqlite3")
+    keys = [cache.key_for("GET", f"/item/{i}") for i in range(12)]
+    try:
+        for i, key in enumerate(keys[:10]):
+            clock.now += 1
+            cache.put(key, "/item", f"payload {i}", ttl=3600)
+        cache.max_bytes = cache.stats()["bytes"]  # full at ten entries
+        clock.now += 1
+        assert cache.get(keys[0], "/item") is not MISS  # touch the oldest entry
+
+        for key in keys[10:]:
+            clock.now += 1
+            cache.put(key, "/item", "payload x", ttl=3600)
+
+        stats = cache.stats()
+        assert stats["bytes"] <= cache.max_bytes
+        assert stats["endpoints"]["/item"]["evictions"] == 2
+        assert cache.get(keys[0], "/item") is not MISS  # recently used survives
+        assert [cache.get(k, "/item") is MISS for k in keys[1:4]] == [True, True, False]
+        assert cache.get(keys[-1], "/item") is not MISS
+    finally:
+        cache.close()
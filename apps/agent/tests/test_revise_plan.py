@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import copy
+
+from revise_plan import PlanEditor, PlanReviser
+
+HOTELS = [{"id": f"h{n}", "name": f"Hotel {n}", "latitude": 43.0, "longitude": 10.0} for n in range(4)]
+ACTIVITY = {"id": "a1", "name": "Museo", "types": ["museum"], "latitude": 43.01, "longitude": 10.0}
+
+
+def apply_patch(document: dict, ops: list[dict]) -> dict:
+    """RFC 6902 add/replace/remove; fails like a real applier when a parent is missing."""
+    document = copy.deepcopy(document)
+    for op in ops:
+        *parents, last = op["path"][1:].split("/")
+        target = document
+        for key in parents:
+            target = target[int(key)] if isinstance(target, list) else target[key]
+        if isinstance(target, list):
+            index = int(last)
+            if op["op"] == "add":
+                target.insert(index, copy.deepcopy(op["value"]))
+            elif op["op"] == "remove":
+                target.pop(index)
+            else:
+                target[index] = copy.deepcopy(op["value"])
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            assert op["op"] == "add" or last in target, op
+            target[last] = copy.deepcopy(op["value"])
+    return document
+
+
+def _plan(**extra) -> dict:
+    return {
+        "days": [
+            {"items": [
+                {"time": "15:00", "type": "accommodation", "title": "Check-in", "ref": "h0"},
+                {"time": "17:00", "type": "activity", "title": "Museo", "ref": "a1"},
+            ]},
+            {"items": [{"time": "08:30", "type": "accommodation", "title": "Breakfast at Hotel 0", "ref": "h0"}]},
+        ],
+        **extra,
+    }
+
+
+def test_set_adds_a_missing_parent_as_one_op():
+    plan = _plan()
+    editor = PlanEditor(copy.deepcopy(plan))
+    editor.set(("summary", "activities"), 3)
+    assert editor.ops == [{"op": "add", "path": "/summary", "value": {"activities": 3}}]
+    assert apply_patch(plan, editor.ops) == editor.plan
+
+    editor.set(("summary", "activities"), 4)
+    assert editor.ops[-1] == {"op": "replace", "path": "/summary/activities", "value": 4, "previous": 3}
+
+
+def test_revision_without_summary_yields_an_applicable_patch():
+    plan = _plan()
+    row = {"plan": plan, "accommodation": [HOTELS[0]], "activities": [ACTIVITY], "transportation": {}}
+
+    revised, entry = PlanReviser(row, {"accommodation": [HOTELS[1]]}).revise()
+
+    assert {"op": "add", "path": "/summary", "value": {"activities": 1}} in entry["patch"]
+    assert apply_patch(plan, entry["patch"]) == revised
+
+
+def test_hotel_titles_do_not_grow_across_revisions():
+    plan = _plan(summary={"activities": 1})
+    for old, new in zip(HOTELS, HOTELS[1:]):
+        row = {"plan": plan, "accommodation": [old], "activities": [ACTIVITY], "transportation": {}}
+        plan, entry = PlanReviser(row, {"accommodation": [new]}).revise()
+        assert apply_patch(row["plan"], entry["patch"]) == plan
+
+    titles = [item["title"] for day in plan["days"] for item in day["items"] if item["type"] == "accommodation"]
+    assert titles == ["Hotel 3", "Breakfast at Hotel 3"]
+    assert all(item["ref"] == "h3" for day in plan["days"] for item in day["items"] if item["type"] == "accommodation")
+
+
+def test_hotel_change_leaves_other_stays_alone():
+    plan = _plan(summary={"activities": 1})
+    plan["days"][1]["items"].append({"time": "12:00", "type": "accommodation", "title": "Check-in Hotel 2", "ref": "h2"})
+    row = {"plan": plan, "accommodation": [HOTELS[0], HOTELS[2]], "activities": [ACTIVITY], "transportation": {}}
+
+    revised, _ = PlanReviser(row, {"accommodation": [HOTELS[1], HOTELS[2]]}).revise()
+
+    assert revised["days"][1]["items"][-1] == plan["days"][1]["items"][-1]
+
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import search_places
+from search_places import SearchTask, run_searches
+from shared.maps_client import MapsClient
+from shared.response_cache import ResponseCache
+
+
+class PagingPlaces(BaseHTTPRequestHandler):
+    """Text search with two pages whose token is only valid for the page it came with."""
+
+    tokens = itertools.count()
+    valid: set[str] = set()
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        query = {k: v[-1] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        if "pagetoken" in query:
+            if query["pagetoken"] not in self.valid:
+                payload = {"status": "INVALID_REQUEST", "results": []}
+            else:
+                self.valid.discard(query["pagetoken"])
+                payload = {"status": "OK", "results": [_place("p2")]}
+        else:
+            token = f"t{next(self.tokens)}"
+            self.valid.add(token)
+            payload = {"status": "OK", "results": [_place("p1")], "next_page_token": token}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _place(place_id: str) -> dict:
+    return {"place_id": place_id, "name": place_id, "geometry": {"location": {"lat": 43.0, "lng": 10.0}}}
+
+
+@pytest.fixture
+def maps_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PagingPlaces)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_paged_search_with_warm_cache_follows_fresh_tokens(maps_url, tmp_path, monkeypatch):
+    monkeypatch.setattr(search_places, "PAGE_TOKEN_DELAY", 0.0)
+    cache = ResponseCache(tmp_path / "cache.sqlite3")
+    client = MapsClient("test-key", base_url=maps_url, cache=cache)
+    task = SearchTask(category="Museums", query="museum")
+
+    for _ in range(2):  # the second run starts with a warm cache
+        summary = run_searches(client, [task], 43.0, 10.0, 25_000, tmp_path / "out", workers=1, pages=2)
+        assert summary["errors"] == []
+        assert summary["places"] == 2
+
+
+def test_single_page_search_is_served_from_cache(maps_url, tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite3")
+    client = MapsClient("test-key", base_url=maps_url, cache=cache)
+
+    first = client.text_search("museum", 43.0, 10.0, 25_000)
+    second = client.text_search("museum", 43.0, 10.0, 25_000)
+
+    assert second == first
+    assert cache.stats()["endpoints"]["/maps/api/place/textsearch/json"]["hits"] == 1